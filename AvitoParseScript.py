@@ -1,3 +1,15 @@
+import json
+import time
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.common.by import By
+from webdriver_manager.chrome import ChromeDriverManager
+
+from avito_extract import AddressExtractor
+from listing_store import ListingStore, card_hash, listing_id
+
+
 def setup_driver():
     options = webdriver.ChromeOptions()
     options.add_argument('--disable-blink-features=AutomationControlled')
@@ -14,43 +26,35 @@ def setup_driver():
         return None
 
 
+address_extractor = AddressExtractor()
+
+
 def get_hotel_address(driver):
-    address_selectors = [
-        '//div[@data-marker="seller-address/address"]',
-        '//span[@itemprop="streetAddress"]',
-        '//div[contains(@class, "style-item-address")]',
-        '//div[contains(text(), "Адрес:")]/following-sibling::div',
-        '//div[contains(@class, "location-value")]'
-    ]
-
-    for selector in address_selectors:
-        try:
-            element = WebDriverWait(driver, 3).until(
-                EC.visibility_of_element_located((By.XPATH, selector)))
-            address = element.text.strip()
-            if address and len(address) > 5:
-                return address
-        except:
-            continue
-
-    return "Адрес не указан"
-
-
-def parse_hotels(driver, city, max_results=5):
+    # Все селекторы по одному разбору HTML; живой DOM ждётся, только если адреса в HTML нет
+    return address_extractor.extract_from_driver(driver)
+
+
+def parse_hotels(driver, city, max_results=5, store=None):
+    """Новые и изменённые объявления; неизменённые (по store) только отмечаются как увиденные."""
     base_url = f"https://www.avito.ru/{city}/predlozheniya_uslug/domashniy_personalgostinicy-ASgBAgICAUSYA9IV?q=гостиница"
     driver.get(base_url)
     time.sleep(3)
 
     results = []
     seen_links = set()
+    processed = 0
+    loaded = 0
 
-    while len(results) < max_results:
+    while processed < max_results:
         driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
         time.sleep(2)
 
         items = driver.find_elements(By.XPATH, '//div[@data-marker="item"]')
+        if len(items) <= loaded:
+            break
+        loaded = len(items)
 
-        for item in items[len(results):max_results]:
+        for item in items[processed:max_results]:
             try:
                 link_element = item.find_element(By.XPATH, './/a[@data-marker="item-title"]')
                 link = link_element.get_attribute('href')
@@ -58,6 +62,12 @@ def parse_hotels(driver, city, max_results=5):
                 if link in seen_links:
                     continue
                 seen_links.add(link)
+                processed += 1
+
+                item_id = listing_id(link)
+                item_hash = card_hash(item.get_attribute('outerHTML'))
+                if store is not None and store.check(item_id, item_hash) is None:
+                    continue
 
                 title = link_element.text.strip()
 
@@ -69,7 +79,11 @@ def parse_hotels(driver, city, max_results=5):
                 # Получаем адрес
                 address = get_hotel_address(driver)
 
+                if store is not None:
+                    store.save(item_id, link, city, title, address, item_hash)
                 results.append({
+                    'id': item_id,
+                    'city': city,
                     'title': title,
                     'address': address,
                     'link': link
@@ -79,7 +93,7 @@ def parse_hotels(driver, city, max_results=5):
                 driver.close()
                 driver.switch_to.window(driver.window_handles[0])
 
-                if len(results) >= max_results:
+                if processed >= max_results:
                     break
 
             except Exception as e:
@@ -89,7 +103,7 @@ def parse_hotels(driver, city, max_results=5):
     return results
 
 
-if name == "main":
+if __name__ == "__main__":
     city = "krasnodar"  # Можно изменить на другой город
     max_results = 5
 
@@ -98,25 +112,25 @@ if name == "main":
         print("Не удалось инициализировать ChromeDriver")
         exit()
 
+    store = ListingStore()
     try:
-        hotels = parse_hotels(driver, city, max_results)
+        hotels = parse_hotels(driver, city, max_results, store)
 
-        print("\n=== Найденные гостиницы ===")
+        print("\n=== Новые и изменённые гостиницы ===")
         for i, hotel in enumerate(hotels, 1):
             print(f"{i}. {hotel['title']}")
             print(f"   Адрес: {hotel['address']}")
             print(f"   Ссылка: {hotel['link']}")
             print("-" * 50)
 
-        # Сохранение в файл
-        with open('hotels.txt', 'w', encoding='utf-8') as f:
+        # Все объявления — в listings.sqlite3, новые и изменённые дописываются в JSONL
+        with open('hotels.jsonl', 'a', encoding='utf-8') as f:
             for hotel in hotels:
-                f.write(f"Название: {hotel['title']}\n")
-                f.write(f"Адрес: {hotel['address']}\n")
-                f.write(f"Ссылка: {hotel['link']}\n\n")
-        print(f"\nРезультаты сохранены в hotels.txt")
+                f.write(json.dumps(hotel, ensure_ascii=False) + "\n")
+        print(f"\nРезультаты сохранены в hotels.jsonl и listings.sqlite3")
 
     except Exception as e:
         print(f"Ошибка при парсинге: {e}")
     finally:
-        driver.quit()
\ No newline at end of file
+        driver.quit()
+        store.close()
\ No newline at end of file
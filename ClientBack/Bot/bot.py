@@ -5,7 +5,10 @@ import sys
 from aiogram import Bot
 from aiogram import Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
 from environs import Env
 # from DataBase import Base, engineЙ
@@ -15,15 +18,46 @@ env = Env()
 env.read_env()
 bot_token = env('BOT_TOKEN')
 
-dp = Dispatcher(storage=MemoryStorage())
+# memory — состояния анкет в памяти процесса (один воркер, теряются при перезапуске),
+# postgres — в таблице bot_fsm, redis — в Redis (или совместимом сервере)
+FSM_STORAGE = env.str('FSM_STORAGE', 'memory')
+FSM_TTL = env.int('FSM_TTL', 24 * 3600)
+
+
+def make_storage() -> BaseStorage:
+    if FSM_STORAGE == 'postgres':
+        from Bot.pg_storage import PostgresStorage
+        return PostgresStorage(env.str('DATABASE_URL'), ttl=FSM_TTL)
+    if FSM_STORAGE == 'redis':
+        from aiogram.fsm.storage.redis import RedisStorage
+        return RedisStorage.from_url(env.str('REDIS_URL', 'redis://localhost:6379/0'),
+                                     state_ttl=FSM_TTL, data_ttl=FSM_TTL)
+    return MemoryStorage()
+
+
+dp = Dispatcher(storage=make_storage())
 dp.include_router(CommanHandler.router)
+dp.startup.register(CommanHandler.complaint_store.start)
+dp.shutdown.register(CommanHandler.geocoder.close)
+dp.shutdown.register(CommanHandler.complaint_store.close)
 
 
 # Base.metadata.create_all(engine)
 
+# polling — long-polling из одного процесса, webhook — aiohttp-сервер (Bot/webhook.py)
+BOT_MODE = env.str('BOT_MODE', 'polling')
+# Другой сервер Bot API (локальный telegram-bot-api или заглушка для воспроизведения обновлений)
+TELEGRAM_API_URL = env.str('TELEGRAM_API_URL', '')
+
+
 async def main() -> None:
-    bot = Bot(token=bot_token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-    await dp.start_polling(bot)
+    session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None
+    bot = Bot(token=bot_token, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    if BOT_MODE == 'webhook':
+        from Bot.webhook import run_webhook
+        await run_webhook(dp, bot)
+    else:
+        await dp.start_polling(bot)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,295 @@
+"""Асинхронная проверка адресов жалоб через геокодеры с постоянным кэшем.
+
+Раньше обработчик бота вызывал requests/geopy прямо в event loop, и каждый запрос
+к геокодеру останавливал бота для всех пользователей, а одни и те же адреса
+геокодировались снова и снова. Здесь:
+  * запросы идут через aiohttp, у каждого провайдера свой таймаут и свой
+    минимальный интервал между запросами (Nominatim разрешает не чаще 1 в секунду);
+  * результат хранится в SQLite по нормализованному адресу: найденный — на
+    GEOCODE_CACHE_TTL, «не найден» — на GEOCODE_NEGATIVE_TTL. Ошибки и таймауты
+    провайдеров не кэшируются;
+  * одинаковые адреса, которые проверяются одновременно, ждут один общий запрос.
+
+Адреса провайдеров задаются переменными окружения, поэтому геокодер можно
+проверить на локальной заглушке:
+    YANDEX_GEOCODER_URL=http://127.0.0.1:9000/yandex NOMINATIM_URL=http://127.0.0.1:9000/search \\
+        python -m Bot.geocoder "Ленина 12, Краснодар"
+"""
+import asyncio
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+YANDEX_GEOCODER_URL = os.environ.get("YANDEX_GEOCODER_URL", "https://geocode-maps.yandex.ru/1.x")
+NOMINATIM_URL = os.environ.get("NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
+NOMINATIM_USER_AGENT = os.environ.get("NOMINATIM_USER_AGENT", "myapp")
+
+GEOCODE_CACHE_PATH = os.environ.get("GEOCODE_CACHE_PATH", "geocode_cache.sqlite3")
+GEOCODE_CACHE_TTL = int(os.environ.get("GEOCODE_CACHE_TTL", str(30 * 24 * 3600)))
+GEOCODE_NEGATIVE_TTL = int(os.environ.get("GEOCODE_NEGATIVE_TTL", str(24 * 3600)))
+
+# Таймаут запроса (с) и минимальный интервал между запросами (с) для провайдеров
+YANDEX_TIMEOUT = float(os.environ.get("YANDEX_TIMEOUT", "5"))
+YANDEX_MIN_INTERVAL = float(os.environ.get("YANDEX_MIN_INTERVAL", "0.05"))
+NOMINATIM_TIMEOUT = float(os.environ.get("NOMINATIM_TIMEOUT", "10"))
+NOMINATIM_MIN_INTERVAL = float(os.environ.get("NOMINATIM_MIN_INTERVAL", "1"))
+
+# Адрес подходит, если геокодер отнёс его к Краснодарскому краю
+REGION_MARKERS = ("краснодарский край", "краснодар")
+
+GeocodeResult = Tuple[bool, Optional[str]]
+
+_NON_WORD = re.compile(r"[^0-9a-zа-я]+")
+
+
+def cache_key(address: str) -> str:
+    """Ключ кэша: регистр, ё, пунктуация и лишние пробелы не важны.
+
+    Порядок слов сохраняется: «д 12 корп 1» и «д 1 корп 12» — разные адреса.
+    """
+    text = _NON_WORD.sub(" ", address.lower().replace("ё", "е"))
+    return " ".join(text.split())
+
+
+def in_region(full_address: str) -> bool:
+    text = full_address.lower().replace("ё", "е")
+    return any(marker in text for marker in REGION_MARKERS)
+
+
+class ProviderError(Exception):
+    """Провайдер не ответил (таймаут, сеть, ошибка HTTP) — результат неизвестен."""
+
+
+class RateLimiter:
+    """Не чаще одного запроса за min_interval секунд."""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._lock = asyncio.Lock()
+        self._next = 0.0
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            if self._next > now:
+                await asyncio.sleep(self._next - now)
+                now = self._next
+            self._next = now + self.min_interval
+
+
+class Provider:
+    name = ""
+
+    def __init__(self, url: str, timeout: float, min_interval: float):
+        self.url = url
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.limiter = RateLimiter(min_interval)
+
+    async def _get_json(self, session: aiohttp.ClientSession, params: Dict[str, str], headers=None):
+        await self.limiter.wait()
+        try:
+            async with session.get(self.url, params=params, headers=headers, timeout=self.timeout) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            raise ProviderError(f"{self.name}: {e!r}") from e
+
+    async def lookup(self, session: aiohttp.ClientSession, address: str) -> Optional[str]:
+        """Полный адрес, который нашёл провайдер, или None."""
+        raise NotImplementedError
+
+
+class YandexProvider(Provider):
+    name = "yandex"
+
+    def __init__(self, api_key: str, url: str = YANDEX_GEOCODER_URL, timeout: float = YANDEX_TIMEOUT,
+                 min_interval: float = YANDEX_MIN_INTERVAL):
+        super().__init__(url, timeout, min_interval)
+        self.api_key = api_key
+
+    async def lookup(self, session: aiohttp.ClientSession, address: str) -> Optional[str]:
+        data = await self._get_json(session, {
+            "apikey": self.api_key,
+            "geocode": address,
+            "format": "json",
+            "lang": "ru_RU",
+            "results": "1",
+        })
+        try:
+            members = data["response"]["GeoObjectCollection"]["featureMember"]
+            if not members:
+                return None
+            return members[0]["GeoObject"]["metaDataProperty"]["GeocoderMetaData"]["text"]
+        except (KeyError, IndexError, TypeError) as e:
+            raise ProviderError(f"{self.name}: неожиданный ответ {e!r}") from e
+
+
+class NominatimProvider(Provider):
+    name = "nominatim"
+
+    def __init__(self, url: str = NOMINATIM_URL, timeout: float = NOMINATIM_TIMEOUT,
+                 min_interval: float = NOMINATIM_MIN_INTERVAL, user_agent: str = NOMINATIM_USER_AGENT):
+        super().__init__(url, timeout, min_interval)
+        self.user_agent = user_agent
+
+    async def lookup(self, session: aiohttp.ClientSession, address: str) -> Optional[str]:
+        data = await self._get_json(session, {"q": address, "format": "json", "limit": "1"},
+                                    headers={"User-Agent": self.user_agent})
+        if not data:
+            return None
+        try:
+            return data[0]["display_name"]
+        except (KeyError, IndexError, TypeError) as e:
+            raise ProviderError(f"{self.name}: неожиданный ответ {e!r}") from e
+
+
+class GeocodeCache:
+    """Результаты геокодирования в SQLite. Запросы к файлу идут в отдельном потоке."""
+
+    def __init__(self, path: str = GEOCODE_CACHE_PATH, ttl: int = GEOCODE_CACHE_TTL,
+                 negative_ttl: int = GEOCODE_NEGATIVE_TTL):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # Соединение одно на все потоки to_thread, поэтому запросы к нему под блокировкой
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS geocode_cache (
+                key TEXT PRIMARY KEY,
+                found INTEGER NOT NULL,
+                full_address TEXT,
+                provider TEXT,
+                expires_at REAL NOT NULL
+            )""")
+        self._conn.commit()
+
+    def _get(self, key: str) -> Optional[GeocodeResult]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT found, full_address FROM geocode_cache WHERE key = ? AND expires_at > ?",
+                (key, time.time())).fetchone()
+        if row is None:
+            return None
+        return bool(row[0]), row[1]
+
+    def _put(self, key: str, result: GeocodeResult, provider: Optional[str]) -> None:
+        ttl = self.ttl if result[0] else self.negative_ttl
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocode_cache (key, found, full_address, provider, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, int(result[0]), result[1], provider, time.time() + ttl))
+            self._conn.execute("DELETE FROM geocode_cache WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+
+    async def get(self, key: str) -> Optional[GeocodeResult]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def put(self, key: str, result: GeocodeResult, provider: Optional[str]) -> None:
+        await asyncio.to_thread(self._put, key, result, provider)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class Geocoder:
+    """Проверка адреса: провайдеры по очереди, первый найденный адрес в регионе — ответ."""
+
+    def __init__(self, providers: List[Provider], cache: Optional[GeocodeCache] = None):
+        self.providers = providers
+        self.cache = cache if cache is not None else GeocodeCache()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.stats = {"lookups": 0, "cache_hits": 0, "coalesced": 0, "provider_calls": 0, "provider_errors": 0}
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    async def geocode(self, address: str) -> GeocodeResult:
+        """(True, полный адрес), если адрес найден и относится к краю, иначе (False, None)."""
+        self.stats["lookups"] += 1
+        key = cache_key(address)
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await self._resolve(key, address)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение уже передано ждущим; если их нет, не оставляем его «непрочитанным»
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def _resolve(self, key: str, address: str) -> GeocodeResult:
+        cached = await self.cache.get(key)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached
+
+        session = await self._get_session()
+        failed = False
+        for provider in self.providers:
+            print(f"🟡 Проверка адреса через {provider.name}: {address}")
+            self.stats["provider_calls"] += 1
+            try:
+                full_address = await provider.lookup(session, address)
+            except ProviderError as e:
+                self.stats["provider_errors"] += 1
+                failed = True
+                print(f"❌ Ошибка геокодера {e}")
+                continue
+            if full_address is None:
+                print(f"🔴 Адрес не найден ({provider.name})")
+                continue
+            print(f"🟢 Найдено ({provider.name}): {full_address}")
+            if in_region(full_address):
+                result = (True, full_address)
+                await self.cache.put(key, result, provider.name)
+                return result
+            print("🔴 Адрес найден, но вне Краснодарского края")
+
+        # «Не найден» кэшируем, только если все провайдеры действительно ответили
+        if not failed:
+            await self.cache.put(key, (False, None), None)
+        return False, None
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+        self.cache.close()
+
+
+async def _main(addresses: List[str]) -> None:
+    geocoder = Geocoder([YandexProvider(os.environ.get("YANDEX_API_KEY", "")), NominatimProvider()])
+    try:
+        results = await asyncio.gather(*(geocoder.geocode(address) for address in addresses))
+        for address, (found, full_address) in zip(addresses, results):
+            print(f"{address} -> {full_address if found else 'не найден'}")
+        print(geocoder.stats)
+    finally:
+        await geocoder.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main(sys.argv[1:]))
@@ -0,0 +1,135 @@
+"""Хранилище состояний FSM aiogram в Postgres.
+
+С MemoryStorage анкета жалобы (девять шагов ComplaintForm) живёт в памяти одного
+процесса: после перезапуска все начатые жалобы теряются, а несколько воркеров бота
+за webhook не видят состояния друг друга. PostgresStorage хранит состояние и
+данные анкеты в таблице bot_fsm, одна строка на ключ (бот, чат, пользователь, ...).
+
+Брошенные анкеты истекают: каждая запись продлевает строку на ttl секунд, строки
+с истёкшим сроком не читаются и периодически удаляются.
+"""
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, Mapping, Optional
+
+import asyncpg
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+FSM_TTL = int(os.environ.get("FSM_TTL", str(24 * 3600)))
+# Как часто удалять истёкшие строки (с)
+FSM_CLEANUP_INTERVAL = float(os.environ.get("FSM_CLEANUP_INTERVAL", "600"))
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS bot_fsm (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data JSONB NOT NULL DEFAULT '{}',
+    expires_at TIMESTAMPTZ NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_bot_fsm_expires_at ON bot_fsm (expires_at);
+"""
+
+# Данные и состояние истёкшей строки считаются пустыми
+SET_STATE_SQL = """
+INSERT INTO bot_fsm AS f (key, state, expires_at) VALUES ($1, $2, now() + make_interval(secs => $3))
+ON CONFLICT (key) DO UPDATE SET
+    state = EXCLUDED.state,
+    data = CASE WHEN f.expires_at > now() THEN f.data ELSE '{}' END,
+    expires_at = EXCLUDED.expires_at
+"""
+
+SET_DATA_SQL = """
+INSERT INTO bot_fsm AS f (key, data, expires_at) VALUES ($1, $2::jsonb, now() + make_interval(secs => $3))
+ON CONFLICT (key) DO UPDATE SET
+    state = CASE WHEN f.expires_at > now() THEN f.state END,
+    data = EXCLUDED.data,
+    expires_at = EXCLUDED.expires_at
+"""
+
+# update_data одним запросом вместо get_data + set_data
+UPDATE_DATA_SQL = """
+INSERT INTO bot_fsm AS f (key, data, expires_at) VALUES ($1, $2::jsonb, now() + make_interval(secs => $3))
+ON CONFLICT (key) DO UPDATE SET
+    state = CASE WHEN f.expires_at > now() THEN f.state END,
+    data = CASE WHEN f.expires_at > now() THEN f.data ELSE '{}' END || EXCLUDED.data,
+    expires_at = EXCLUDED.expires_at
+RETURNING data::text
+"""
+
+# Пустая строка (state.clear()) не хранится
+DELETE_EMPTY_SQL = "DELETE FROM bot_fsm WHERE key = $1 AND state IS NULL AND data = '{}'"
+
+
+def storage_key(key: StorageKey) -> str:
+    parts = [key.bot_id, key.chat_id, key.user_id, key.thread_id or "", key.business_connection_id or "",
+             key.destiny]
+    return ":".join(str(part) for part in parts)
+
+
+class PostgresStorage(BaseStorage):
+    """FSM-хранилище aiogram на таблице bot_fsm с истечением по ttl."""
+
+    def __init__(self, dsn: str, ttl: int = FSM_TTL, pool_size: int = 5):
+        self.dsn = dsn
+        self.ttl = ttl
+        self.pool_size = pool_size
+        self._pool: Optional[asyncpg.Pool] = None
+        self._pool_lock = asyncio.Lock()
+        self._next_cleanup = 0.0
+
+    async def _get_pool(self) -> asyncpg.Pool:
+        if self._pool is not None:
+            return self._pool
+        async with self._pool_lock:
+            if self._pool is None:
+                pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=self.pool_size)
+                await pool.execute(SCHEMA_SQL)
+                self._pool = pool
+            return self._pool
+
+    async def _cleanup(self, pool: asyncpg.Pool) -> None:
+        now = time.monotonic()
+        if now >= self._next_cleanup:
+            self._next_cleanup = now + FSM_CLEANUP_INTERVAL
+            await pool.execute("DELETE FROM bot_fsm WHERE expires_at <= now()")
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        pool = await self._get_pool()
+        value = state.state if isinstance(state, State) else state
+        k = storage_key(key)
+        await pool.execute(SET_STATE_SQL, k, value, float(self.ttl))
+        if value is None:
+            await pool.execute(DELETE_EMPTY_SQL, k)
+        await self._cleanup(pool)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        pool = await self._get_pool()
+        return await pool.fetchval(
+            "SELECT state FROM bot_fsm WHERE key = $1 AND expires_at > now()", storage_key(key))
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        pool = await self._get_pool()
+        k = storage_key(key)
+        await pool.execute(SET_DATA_SQL, k, json.dumps(dict(data), ensure_ascii=False), float(self.ttl))
+        if not data:
+            await pool.execute(DELETE_EMPTY_SQL, k)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        pool = await self._get_pool()
+        data = await pool.fetchval(
+            "SELECT data::text FROM bot_fsm WHERE key = $1 AND expires_at > now()", storage_key(key))
+        return json.loads(data) if data is not None else {}
+
+    async def update_data(self, key: StorageKey, data: Mapping[str, Any]) -> Dict[str, Any]:
+        pool = await self._get_pool()
+        result = await pool.fetchval(UPDATE_DATA_SQL, storage_key(key),
+                                     json.dumps(dict(data), ensure_ascii=False), float(self.ttl))
+        return json.loads(result)
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
@@ -0,0 +1,124 @@
+"""Воспроизведение записанных обновлений Telegram на локальном webhook.
+
+Обновления берутся из JSONL-файла (одно Update на строку — так пишет
+WEBHOOK_RECORD_PATH) или генерируются: --generate N создаёт N пользователей,
+которые одновременно проходят анкету жалобы до шага с улицей.
+
+Обновления одного пользователя отправляются по очереди (следующее — после ответа
+на предыдущее), разных пользователей — параллельно, как это делает Telegram.
+На 503 (очередь webhook переполнена) запрос повторяется. В конце печатаются
+/metrics сервера и пропускная способность.
+
+Пример (бот с BOT_MODE=webhook и TELEGRAM_API_URL на заглушке Bot API):
+    python -m Bot.replay_updates --generate 500 --url http://127.0.0.1:8080/webhook
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, List
+
+import aiohttp
+
+ANSWERS = ["/start", "Оставить анонимно", "Оставить анонимно", "ул Красная, 1",
+           "Соседи майнят", "Краснодар", "Ленина"]
+
+
+def generate_updates(users: int) -> List[dict]:
+    updates = []
+    now = int(time.time())
+    for step, text in enumerate(ANSWERS):
+        for user in range(users):
+            user_id = 10_000_000 + user
+            update_id = len(updates) + 1
+            updates.append({
+                "update_id": update_id,
+                "message": {
+                    "message_id": update_id,
+                    "date": now,
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": {"id": user_id, "is_bot": False, "first_name": f"user{user}"},
+                    "text": text,
+                    **({"entities": [{"type": "bot_command", "offset": 0, "length": len(text)}]}
+                       if text.startswith("/") else {}),
+                },
+            })
+    return updates
+
+
+def user_of(update: dict) -> int:
+    for value in update.values():
+        if isinstance(value, dict):
+            sender = value.get("from") or value.get("chat")
+            if sender:
+                return sender["id"]
+    return -update["update_id"]
+
+
+async def replay(url: str, updates: List[dict], concurrency: int, secret: str) -> Dict[str, float]:
+    by_user: "OrderedDict[int, List[dict]]" = OrderedDict()
+    for update in updates:
+        by_user.setdefault(user_of(update), []).append(update)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    counters = {"sent": 0, "retried_503": 0, "errors": 0}
+
+    async def send_user(session: aiohttp.ClientSession, user_updates: List[dict]) -> None:
+        for update in user_updates:
+            while True:
+                async with semaphore:
+                    async with session.post(url, json=update, headers=headers) as response:
+                        status = response.status
+                if status == 503:
+                    counters["retried_503"] += 1
+                    await asyncio.sleep(0.1)
+                    continue
+                if status != 200:
+                    counters["errors"] += 1
+                counters["sent"] += 1
+                break
+
+    async with aiohttp.ClientSession() as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(send_user(session, u) for u in by_user.values()))
+        sent_time = time.perf_counter() - started
+
+        # Ждём, пока сервер обработает очередь
+        metrics_url = url.rsplit("/", 1)[0] + "/metrics"
+        while True:
+            async with session.get(metrics_url) as response:
+                metrics = await response.json()
+            if metrics["pending"] == 0 and metrics["in_flight"] == 0:
+                break
+            await asyncio.sleep(0.05)
+        total_time = time.perf_counter() - started
+
+    return {**counters, "users": len(by_user), "send_seconds": sent_time, "total_seconds": total_time,
+            "updates_per_second": len(updates) / total_time, "server": metrics}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", nargs="?", help="JSONL с обновлениями")
+    parser.add_argument("--generate", type=int, default=0, help="сгенерировать анкеты для N пользователей")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--concurrency", type=int, default=100, help="одновременных запросов к webhook")
+    parser.add_argument("--secret", default="")
+    args = parser.parse_args()
+
+    if args.generate:
+        updates = generate_updates(args.generate)
+    elif args.path:
+        with open(args.path, encoding="utf-8") as f:
+            updates = [json.loads(line) for line in f if line.strip()]
+    else:
+        parser.error("нужен файл с обновлениями или --generate")
+
+    result = asyncio.run(replay(args.url, updates, args.concurrency, args.secret))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
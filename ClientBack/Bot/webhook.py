@@ -0,0 +1,183 @@
+"""Режим webhook: aiohttp-сервер, принимающий обновления от Telegram.
+
+start_polling забирает обновления одним процессом и по одному long-poll запросу,
+и во время массовых жалоб это упирается в пропускную способность. В режиме
+webhook Telegram сам присылает обновления POST-запросами на WEBHOOK_PATH:
+  * обработчик сразу отвечает 200, а обновление ставит в очередь UpdateQueue;
+  * обновления разных пользователей обрабатываются параллельно, но не больше
+    WEBHOOK_CONCURRENCY одновременно; обновления одного пользователя — строго
+    по порядку (анкета жалобы — последовательность шагов FSM);
+  * если в очереди больше WEBHOOK_MAX_PENDING обновлений, запрос получает 503 и
+    Telegram повторит его позже — память не растёт без ограничений;
+  * GET /metrics — глубина очереди, число обрабатываемых, задержки.
+
+Порядок обновлений одного пользователя гарантируется в пределах процесса. Если
+воркеров несколько, балансировщик должен направлять пользователя всегда в один
+и тот же воркер, а состояния анкет — храниться в общем FSM_STORAGE.
+
+С WEBHOOK_RECORD_PATH входящие обновления дописываются в JSONL-файл, который
+можно воспроизвести локально через replay_updates.py.
+"""
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiogram.webhook.aiohttp_server import setup_application
+from aiohttp import web
+
+WEBHOOK_HOST = os.environ.get("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/webhook")
+# Публичный адрес за балансировщиком; если задан, webhook регистрируется в Telegram при старте
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+WEBHOOK_CONCURRENCY = int(os.environ.get("WEBHOOK_CONCURRENCY", "64"))
+WEBHOOK_MAX_PENDING = int(os.environ.get("WEBHOOK_MAX_PENDING", "10000"))
+WEBHOOK_RECORD_PATH = os.environ.get("WEBHOOK_RECORD_PATH", "")
+
+
+def ordering_key(update: Update) -> int:
+    """Обновления с одинаковым ключом обрабатываются по порядку: пользователь, иначе чат."""
+    event = update.event
+    user = getattr(event, "from_user", None)
+    if user is not None:
+        return user.id
+    chat = getattr(event, "chat", None)
+    if chat is not None:
+        return chat.id
+    return -update.update_id
+
+
+class UpdateQueue:
+    """Очередь обновлений: параллельно по пользователям, последовательно внутри пользователя."""
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, concurrency: int = WEBHOOK_CONCURRENCY,
+                 max_pending: int = WEBHOOK_MAX_PENDING):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._chains: Dict[int, Deque] = {}
+        self._tasks = set()
+        self.pending = 0
+        self.in_flight = 0
+        self.stats = {"received": 0, "processed": 0, "failed": 0, "rejected": 0, "max_pending": 0}
+        self._wait_total = 0.0
+        self._handle_total = 0.0
+        self._wait_max = 0.0
+
+    def submit(self, update: Update) -> bool:
+        """Ставит обновление в очередь. False — очередь переполнена."""
+        if self.pending >= self.max_pending:
+            self.stats["rejected"] += 1
+            return False
+        self.stats["received"] += 1
+        self.pending += 1
+        self.stats["max_pending"] = max(self.stats["max_pending"], self.pending)
+
+        key = ordering_key(update)
+        chain = self._chains.get(key)
+        if chain is not None:
+            chain.append((update, time.monotonic()))
+            return True
+        self._chains[key] = deque([(update, time.monotonic())])
+        task = asyncio.create_task(self._drain(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _drain(self, key: int) -> None:
+        chain = self._chains[key]
+        while chain:
+            update, queued_at = chain[0]
+            async with self._semaphore:
+                started = time.monotonic()
+                self.pending -= 1
+                self.in_flight += 1
+                try:
+                    await self.dispatcher.feed_update(self.bot, update)
+                    self.stats["processed"] += 1
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    print(f"❌ Ошибка обработки обновления {update.update_id}: {e!r}")
+                finally:
+                    self.in_flight -= 1
+                    finished = time.monotonic()
+                    self._wait_total += started - queued_at
+                    self._wait_max = max(self._wait_max, started - queued_at)
+                    self._handle_total += finished - started
+            chain.popleft()
+        del self._chains[key]
+
+    async def join(self) -> None:
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def metrics(self) -> Dict[str, float]:
+        done = self.stats["processed"] + self.stats["failed"]
+        return {
+            **self.stats,
+            "pending": self.pending,
+            "in_flight": self.in_flight,
+            "active_users": len(self._chains),
+            "avg_wait_ms": self._wait_total / done * 1000 if done else 0.0,
+            "max_wait_ms": self._wait_max * 1000,
+            "avg_handle_ms": self._handle_total / done * 1000 if done else 0.0,
+        }
+
+
+def make_app(dispatcher: Dispatcher, bot: Bot, queue: Optional[UpdateQueue] = None) -> web.Application:
+    queue = queue or UpdateQueue(dispatcher, bot)
+    record = open(WEBHOOK_RECORD_PATH, "a", encoding="utf-8") if WEBHOOK_RECORD_PATH else None
+
+    async def handle_update(request: web.Request) -> web.Response:
+        if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+            return web.Response(status=401)
+        try:
+            payload = await request.json()
+            update = Update.model_validate(payload, context={"bot": bot})
+        except ValueError:
+            return web.Response(status=400)
+        if not queue.submit(update):
+            # Telegram повторит доставку позже
+            return web.Response(status=503)
+        if record is not None:
+            record.write(json.dumps(payload, ensure_ascii=False) + "\n")
+        return web.Response()
+
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.json_response(queue.metrics())
+
+    async def on_shutdown(app: web.Application) -> None:
+        await queue.join()
+        if record is not None:
+            record.close()
+
+    app = web.Application()
+    app["update_queue"] = queue
+    app.router.add_post(WEBHOOK_PATH, handle_update)
+    app.router.add_get("/metrics", handle_metrics)
+    # Очередь дорабатывает до закрытия хранилищ и пула (shutdown диспетчера)
+    app.on_shutdown.append(on_shutdown)
+    setup_application(app, dispatcher, bot=bot)
+    return app
+
+
+async def run_webhook(dispatcher: Dispatcher, bot: Bot) -> None:
+    app = make_app(dispatcher, bot)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    if WEBHOOK_URL:
+        await bot.set_webhook(WEBHOOK_URL + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET or None,
+                              allowed_updates=dispatcher.resolve_used_update_types())
+    print(f"Webhook слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,211 @@
+"""Нормализованный ключ адреса для сопоставления жалоб с клиентами.
+
+Адреса клиентов приходят в кадастровом формате («Краснодарский край, г Краснодар,
+ул Ленина, д. 12»), а адреса жалоб — от геокодеров Яндекса/Nominatim («Россия,
+Краснодарский край, Краснодар, улица Ленина, 12»). address_key() приводит оба к
+одному виду: нижний регистр, ё -> е, сокращения раскрыты (как в normalize_address
+бота), служебные слова без смысла для сравнения (город, дом, корпус, Россия, индекс)
+отброшены, токены отсортированы. Для примеров выше ключ одинаковый:
+«12 край краснодар краснодарский ленина улица».
+
+Ключ считается в базе при записи триггерами: clients.address_key и
+complaints.complaint_address_key, оба с индексом, поэтому сопоставление — обычный
+hash join в SQL. Строки, записанные до появления триггеров, досчитывает migrate.py.
+"""
+import re
+from typing import List, Optional
+
+from db_schema import add_column, create_trigger
+
+# Сокращение -> полное слово. Дефисные сокращения (р-н, ст-ца) раскрываются
+# до разбиения на токены (длинные первыми, см. _HYPHENATED_ORDER), остальные — по токенам.
+HYPHENATED = {
+    "р-н": "район",
+    "ст-ца": "станица",
+    "пр-кт": "проспект",
+    "пр-т": "проспект",
+    "б-р": "бульвар",
+    "мкр-н": "микрорайон",
+    "с/п": "поселение",
+    "с/с": "сельсовет",
+}
+
+ABBREVIATIONS = {
+    "ул": "улица",
+    "пер": "переулок",
+    "пр": "проспект",
+    "просп": "проспект",
+    "пркт": "проспект",
+    "ш": "шоссе",
+    "пл": "площадь",
+    "бул": "бульвар",
+    "туп": "тупик",
+    "наб": "набережная",
+    "мкр": "микрорайон",
+    "мкрн": "микрорайон",
+    "п": "поселок",
+    "пос": "поселок",
+    "пгт": "поселок",
+    "рп": "поселок",
+    "с": "село",
+    "ст": "станица",
+    "х": "хутор",
+    "обл": "область",
+    "г": "город",
+    "гор": "город",
+    "д": "дом",
+    "к": "корпус",
+    "корп": "корпус",
+    "стр": "строение",
+    "лит": "литера",
+}
+
+# Слова, которые один источник пишет, а другой нет
+DROPPED = ("россия", "рф", "город", "дом", "корпус", "строение", "литера")
+
+# «р-н» входит в «мкр-н»: заменённое первым, оно оставило бы «мк район»
+_HYPHENATED_ORDER = sorted(HYPHENATED.items(), key=lambda item: -len(item[0]))
+
+_NON_WORD = re.compile(r"[^0-9a-zа-я]+")
+_DIGIT_LETTER = re.compile(r"(?<=[0-9])(?=[a-zа-я])|(?<=[a-zа-я])(?=[0-9])")
+_DROPPED = frozenset(DROPPED)
+
+
+def address_tokens(address: Optional[str]) -> List[str]:
+    """Токены адреса в исходном порядке — та же нормализация, что и в SQL-функции address_key."""
+    if not address:
+        return []
+    text = address.lower().replace("ё", "е").replace("поселок городского типа", "пгт")
+    for short, full in _HYPHENATED_ORDER:
+        text = text.replace(short, f" {full} ")
+    text = _DIGIT_LETTER.sub(" ", _NON_WORD.sub(" ", text))
+    tokens = []
+    for token in text.split():
+        token = ABBREVIATIONS.get(token, token)
+        if token in _DROPPED or (len(token) == 6 and token.isdigit()):
+            continue
+        tokens.append(token)
+    return tokens
+
+
+def address_key(address: Optional[str]) -> Optional[str]:
+    """Python-версия SQL-функции address_key()."""
+    return " ".join(sorted(set(address_tokens(address)))) or None
+
+
+def _sql_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _values(pairs) -> str:
+    return ", ".join(f"({_sql_literal(k)}, {_sql_literal(v)})" for k, v in pairs)
+
+
+def _hyphenated_sql(expression: str) -> str:
+    for short, full in _HYPHENATED_ORDER:
+        expression = f"replace({expression}, {_sql_literal(short)}, {_sql_literal(' ' + full + ' ')})"
+    return expression
+
+
+ADDRESS_KEY_FUNCTION = r"""
+CREATE OR REPLACE FUNCTION address_key(address text) RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT nullif(string_agg(token, ' ' ORDER BY token), '')
+    FROM (
+        SELECT DISTINCT coalesce(a.full_word, t.token) AS token
+        FROM regexp_split_to_table(
+                 -- 37к1 -> 37 к 1
+                 regexp_replace(regexp_replace(
+                     regexp_replace({hyphenated}, '[^0-9a-zа-я]+', ' ', 'g'),
+                     '([0-9])([a-zа-я])', '\1 \2', 'g'),
+                     '([a-zа-я])([0-9])', '\1 \2', 'g'),
+                 '\s+') AS t(token)
+        LEFT JOIN (VALUES {abbreviations}) AS a(short, full_word) ON a.short = t.token
+    ) s
+    WHERE token <> '' AND token NOT IN ({dropped}) AND token !~ '^[0-9]{{6}}$'
+$$
+""".format(
+    hyphenated=_hyphenated_sql(
+        "replace(replace(lower(address), 'ё', 'е'), 'поселок городского типа', 'пгт')"),
+    abbreviations=_values(ABBREVIATIONS.items()),
+    dropped=", ".join(_sql_literal(word) for word in DROPPED),
+)
+
+CLIENTS_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION clients_address_key() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    -- Массовая загрузка переписывает address и без изменений — ключ тогда не пересчитываем
+    IF TG_OP = 'UPDATE' AND NEW.address IS NOT DISTINCT FROM OLD.address THEN
+        NEW.address_key := OLD.address_key;
+        RETURN NEW;
+    END IF;
+    NEW.address_key := address_key(NEW.address);
+    RETURN NEW;
+END
+$$
+"""
+
+COMPLAINTS_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION complaints_address_key() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.complaint_address_key := address_key(NEW.complaint_address);
+    RETURN NEW;
+END
+$$
+"""
+
+CLIENTS_TRIGGER = """
+CREATE OR REPLACE TRIGGER clients_address_key
+BEFORE INSERT OR UPDATE OF address ON clients
+FOR EACH ROW EXECUTE FUNCTION clients_address_key()
+"""
+
+# Досчёт клиентов, записанных до появления триггера или до изменения нормализации (migrate.py)
+CLIENTS_BACKFILL_SET = "address_key = address_key(address)"
+CLIENTS_BACKFILL_WHERE = "address IS NOT NULL AND address_key IS DISTINCT FROM address_key(address)"
+
+# Таблицу complaints создаёт бот; здесь она только дополняется ключом и индексом
+COMPLAINTS_TRIGGER = """
+CREATE OR REPLACE TRIGGER complaints_address_key
+BEFORE INSERT OR UPDATE OF complaint_address ON complaints
+FOR EACH ROW EXECUTE FUNCTION complaints_address_key()
+"""
+COMPLAINTS_BACKFILL_SQL = """
+UPDATE complaints SET complaint_address_key = address_key(complaint_address)
+WHERE complaint_address IS NOT NULL
+  AND complaint_address_key IS DISTINCT FROM address_key(complaint_address)
+"""
+COMPLAINTS_INDEX = "CREATE INDEX IF NOT EXISTS ix_complaints_address_key ON complaints (complaint_address_key)"
+
+
+def complaints_exist(conn) -> bool:
+    return conn.exec_driver_sql("SELECT to_regclass('complaints') IS NOT NULL").scalar()
+
+
+def ensure_address_keys(conn) -> bool:
+    """Функция ключа и, если их ещё нет, колонка и триггер на clients. True, если триггер создан."""
+    conn.exec_driver_sql(ADDRESS_KEY_FUNCTION)
+    conn.exec_driver_sql(CLIENTS_TRIGGER_FUNCTION)
+    add_column(conn, "clients", "address_key", "TEXT")
+    return create_trigger(conn, "clients", "clients_address_key", CLIENTS_TRIGGER)
+
+
+def ensure_complaint_keys(conn) -> bool:
+    """Ключ, триггер и индекс на complaints. False, если таблицы жалоб ещё нет.
+
+    Жалобы, записанные до появления триггера, досчитываются один раз — когда
+    триггер создаётся (обычно вскоре после того, как бот создал таблицу);
+    повторно это делает migrate.py.
+    """
+    if not complaints_exist(conn):
+        return False
+    conn.exec_driver_sql(ADDRESS_KEY_FUNCTION)
+    conn.exec_driver_sql(COMPLAINTS_TRIGGER_FUNCTION)
+    add_column(conn, "complaints", "complaint_address_key", "TEXT")
+    if create_trigger(conn, "complaints", "complaints_address_key", COMPLAINTS_TRIGGER):
+        conn.exec_driver_sql(COMPLAINTS_BACKFILL_SQL)
+    if not conn.exec_driver_sql("SELECT to_regclass('ix_complaints_address_key') IS NOT NULL").scalar():
+        conn.exec_driver_sql(COMPLAINTS_INDEX)
+    return True
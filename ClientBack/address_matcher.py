@@ -0,0 +1,287 @@
+"""Нечёткое сопоставление адресов жалоб с адресами клиентов.
+
+Точное сравнение (даже по address_key) не находит жалобу, если в адресе опечатка,
+пропущен населённый пункт или добавлены лишние части («Колхозная 37, Мостовской,
+Россия» против «р-н Мостовский, пгт Мостовской, ул Колхозная, д. 37 1»).
+
+Как устроено:
+  * адреса разбиваются на токены той же нормализацией, что и address_key
+    (address_keys.address_tokens); типовые слова (улица, район, ...) не учитываются;
+  * блокировка: клиент попадает в блоки (слово, номер) — по каждому значимому слову
+    адреса и каждому числу (дом, корпус). Жалоба сравнивается только с клиентами из
+    своих блоков, т.е. с тем же номером дома и хотя бы одним общим словом. Блоки
+    больше MAX_BLOCK_SIZE (частые слова вроде «краснодарский») не используются;
+  * опечатки: слово жалобы, которого нет в словаре клиентов, заменяется похожими
+    словами словаря по триграммам (как pg_trgm, сходство Жаккара >= WORD_SIMILARITY);
+  * оценка пары — взвешенный по IDF коэффициент Дайса по совпавшим словам:
+    2 * вес общих слов / (вес слов жалобы + вес слов клиента), от 0 до 1.
+
+Блоки хранятся отсортированными массивами numpy, поиск кандидатов и подсчёт оценок
+для всех жалоб сразу векторный; Python-цикл остаётся только на разбор адресов.
+Изменения клиентов (apply_changes) разбирают только изменённые адреса, поэтому
+индекс не перестраивается целиком после каждой записи в clients.
+"""
+import copy
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from address_keys import ABBREVIATIONS, DROPPED, HYPHENATED, address_tokens
+
+# Клиентов в одном блоке (слово, номер) не больше — иначе блок не используется
+MAX_BLOCK_SIZE = 2000
+# Минимальное триграммное сходство слова жалобы со словом из словаря клиентов (как порог pg_trgm)
+WORD_SIMILARITY = 0.3
+# Сколько похожих слов словаря брать для одного незнакомого слова
+MAX_WORD_EXPANSIONS = 3
+# Минимальная оценка совпадения адресов по умолчанию
+MIN_SCORE = 0.6
+# Не больше стольких чисел адреса участвуют в блоках (дом, корпус, ...)
+MAX_NUMBERS = 3
+
+NUMBER_BITS = 20
+MAX_NUMBER = (1 << NUMBER_BITS) - 1
+
+# Типовые слова есть почти в каждом адресе и пишутся по-разному, на совпадение не влияют
+STOP_WORDS = frozenset(ABBREVIATIONS.values()) | frozenset(HYPHENATED.values()) | frozenset(DROPPED) | {"край"}
+
+
+class AddressMatch(NamedTuple):
+    complaint: int  # номер адреса жалобы во входном списке
+    account_id: int
+    score: float
+
+
+def split_address(address: Optional[str]) -> Tuple[List[str], List[int]]:
+    """(значимые слова, числа) адреса."""
+    words, numbers = [], []
+    for token in address_tokens(address):
+        if token.isdigit():
+            number = int(token)
+            if number <= MAX_NUMBER and number not in numbers and len(numbers) < MAX_NUMBERS:
+                numbers.append(number)
+        elif len(token) > 1 and token not in STOP_WORDS and token not in words:
+            words.append(token)
+    return words, numbers
+
+
+def trigrams(word: str) -> set:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AddressMatcher:
+    """Индекс адресов клиентов для нечёткого поиска.
+
+    Строится один раз на набор клиентов. Изменения клиентов применяет apply_changes:
+    разбираются только изменённые адреса, а веса слов и блоки пересчитываются
+    векторно. apply_changes возвращает новый индекс, текущий не меняется — запросы,
+    начатые до обновления, дорабатывают на нём.
+    """
+
+    def __init__(self, account_ids: Sequence[int], addresses: Sequence[Optional[str]],
+                 max_block_size: int = MAX_BLOCK_SIZE):
+        self.max_block_size = max_block_size
+        self.account_ids = np.empty(0, dtype=np.int64)
+        self.vocabulary: Dict[str, int] = {}
+        self.words: List[str] = []
+        self.trigram_postings: Dict[str, np.ndarray] = {}
+        self.trigram_counts = np.empty(0, dtype=np.int32)
+        self._similar_cache: Dict[str, List[Tuple[int, float]]] = {}
+        # (слово, строка) для каждого слова каждого адреса — по ним считаются IDF и вес строки
+        self._word_ids = np.empty(0, dtype=np.int32)
+        self._word_rows = np.empty(0, dtype=np.int32)
+        # Все ключи блоков (слово, номер) по возрастанию, включая слишком крупные блоки
+        self._all_keys = np.empty(0, dtype=np.int64)
+        self._all_rows = np.empty(0, dtype=np.int32)
+        self._append(account_ids, addresses)
+        self._build_index()
+
+    def _append(self, account_ids: Sequence[int], addresses: Sequence[Optional[str]]) -> None:
+        """Добавляет адреса строками в конец индекса, словарь пополняется новыми словами."""
+        first = len(self.account_ids)
+        new_words = []
+        keys, rows, word_ids, word_rows = [], [], [], []
+        for row, address in enumerate(addresses, start=first):
+            words, numbers = split_address(address)
+            for word in words:
+                word_id = self.vocabulary.get(word)
+                if word_id is None:
+                    word_id = self.vocabulary[word] = len(self.vocabulary)
+                    self.words.append(word)
+                    new_words.append(word)
+                word_ids.append(word_id)
+                word_rows.append(row)
+                for number in numbers:
+                    keys.append((word_id << NUMBER_BITS) | number)
+                    rows.append(row)
+
+        self.account_ids = np.concatenate([self.account_ids, np.asarray(account_ids, dtype=np.int64)])
+        self._word_ids = np.concatenate([self._word_ids, np.array(word_ids, dtype=np.int32)])
+        self._word_rows = np.concatenate([self._word_rows, np.array(word_rows, dtype=np.int32)])
+
+        keys = np.array(keys, dtype=np.int64)
+        rows = np.array(rows, dtype=np.int32)
+        order = np.argsort(keys, kind="stable")
+        keys, rows = keys[order], rows[order]
+        # Вставка в отсортированный массив: новые строки встают после старых с тем же ключом
+        position = np.searchsorted(self._all_keys, keys, side="right")
+        self._all_keys = np.insert(self._all_keys, position, keys)
+        self._all_rows = np.insert(self._all_rows, position, rows)
+
+        if new_words:
+            # Триграммный индекс словаря для слов с опечатками
+            postings = defaultdict(list)
+            for word in new_words:
+                for gram in trigrams(word):
+                    postings[gram].append(self.vocabulary[word])
+            for gram, ids in postings.items():
+                ids = np.array(ids, dtype=np.int32)
+                old = self.trigram_postings.get(gram)
+                self.trigram_postings[gram] = ids if old is None else np.concatenate([old, ids])
+            self.trigram_counts = np.concatenate([
+                self.trigram_counts, np.array([len(trigrams(word)) for word in new_words], dtype=np.int32)])
+            # Похожие слова для незнакомых слов могли появиться в словаре
+            self._similar_cache = {}
+
+    def _remove(self, account_ids: np.ndarray) -> None:
+        """Убирает строки клиентов account_ids и перенумеровывает оставшиеся строки."""
+        keep = ~np.isin(self.account_ids, account_ids)
+        if keep.all():
+            return
+        new_row = (np.cumsum(keep) - 1).astype(np.int32)
+        self.account_ids = self.account_ids[keep]
+        alive = keep[self._word_rows]
+        self._word_ids, self._word_rows = self._word_ids[alive], new_row[self._word_rows[alive]]
+        alive = keep[self._all_rows]
+        self._all_keys, self._all_rows = self._all_keys[alive], new_row[self._all_rows[alive]]
+
+    def _build_index(self) -> None:
+        self.df = np.bincount(self._word_ids, minlength=len(self.vocabulary))
+        n = max(len(self.account_ids), 1)
+        self.idf = np.log(n / np.maximum(self.df, 1.0)) + 1e-3
+        self.row_weight = np.bincount(self._word_rows, weights=self.idf[self._word_ids],
+                                      minlength=len(self.account_ids))
+
+        # Слишком крупные блоки выбрасываем целиком
+        keys = self._all_keys
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.empty(0, dtype=np.int64)
+        counts = np.diff(np.r_[starts, len(keys)])
+        keep = np.repeat(counts <= self.max_block_size, counts)
+        self.keys, self.rows = keys[keep], self._all_rows[keep]
+
+    def apply_changes(self, account_ids: Sequence[int], addresses: Sequence[Optional[str]],
+                      deleted: Sequence[int] = ()) -> "AddressMatcher":
+        """Новый индекс, в котором клиенты account_ids добавлены или заменены, а deleted удалены."""
+        changed = copy.copy(self)
+        changed.vocabulary = dict(self.vocabulary)
+        changed.words = list(self.words)
+        changed.trigram_postings = dict(self.trigram_postings)
+        changed._remove(np.concatenate([np.asarray(account_ids, dtype=np.int64),
+                                        np.asarray(deleted, dtype=np.int64)]))
+        changed._append(account_ids, addresses)
+        changed._build_index()
+        # Слова, оставшиеся без клиентов, больше не считаются словами словаря
+        changed._similar_cache = {}
+        return changed
+
+    def similar_words(self, word: str) -> List[Tuple[int, float]]:
+        """[(id слова словаря, сходство)] — само слово, если оно есть в словаре, иначе похожие."""
+        word_id = self.vocabulary.get(word)
+        if word_id is not None and self.df[word_id]:
+            return [(word_id, 1.0)]
+        cached = self._similar_cache.get(word)
+        if cached is not None:
+            return cached
+
+        grams = trigrams(word)
+        lists = [self.trigram_postings[g] for g in grams if g in self.trigram_postings]
+        result = []
+        if lists:
+            ids, shared = np.unique(np.concatenate(lists), return_counts=True)
+            similarity = shared / (len(grams) + self.trigram_counts[ids] - shared)
+            # Слова всех удалённых клиентов остаются в словаре с df = 0
+            good = (similarity >= WORD_SIMILARITY) & (self.df[ids] > 0)
+            ids, similarity = ids[good], similarity[good]
+            # При равном сходстве — более частое слово, затем по алфавиту: выбор не зависит от порядка слов в словаре
+            result = sorted(zip(ids.tolist(), similarity.tolist()),
+                            key=lambda item: (-item[1], -self.df[item[0]], self.words[item[0]]))[:MAX_WORD_EXPANSIONS]
+        self._similar_cache[word] = result
+        return result
+
+    def match(self, complaints: Iterable[Optional[str]], min_score: float = MIN_SCORE,
+              top: int = 1, ties: bool = False) -> List[AddressMatch]:
+        """Лучшие (до top) совпадения для каждой жалобы с оценкой не ниже min_score.
+
+        ties=True дополнительно оставляет всех клиентов с той же оценкой, что у лучшего:
+        у клиентов с одинаковым адресом оценки равны, и top=1 оставил бы только одного.
+        """
+        q_keys, q_complaint, q_slot, q_weight = [], [], [], []
+        complaint_weight = []
+        slot = 0
+        for index, address in enumerate(complaints):
+            words, numbers = split_address(address)
+            total = 0.0
+            for word in words:
+                expansions = self.similar_words(word)
+                if not expansions:
+                    continue
+                total += max(sim * self.idf[word_id] for word_id, sim in expansions)
+                for word_id, sim in expansions:
+                    weight = sim * self.idf[word_id]
+                    for number in numbers:
+                        q_keys.append((word_id << NUMBER_BITS) | number)
+                        q_complaint.append(index)
+                        q_slot.append(slot)
+                        q_weight.append(weight)
+                slot += 1
+            complaint_weight.append(total)
+
+        if not q_keys:
+            return []
+        q_keys = np.array(q_keys, dtype=np.int64)
+        left = np.searchsorted(self.keys, q_keys, side="left")
+        right = np.searchsorted(self.keys, q_keys, side="right")
+        counts = right - left
+        if not counts.sum():
+            return []
+
+        # Все пары (запрос, клиент) из найденных блоков
+        query = np.repeat(np.arange(len(q_keys)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        rows = self.rows[np.repeat(left, counts) + offsets].astype(np.int64)
+        complaint = np.array(q_complaint, dtype=np.int64)[query]
+        slots = np.array(q_slot, dtype=np.int64)[query]
+        weight = np.array(q_weight)[query]
+
+        # Одно слово жалобы засчитывается клиенту один раз — с наибольшим весом
+        n_rows = len(self.account_ids)
+        order = np.lexsort((-weight, slots * n_rows + rows))
+        pair = (slots * n_rows + rows)[order]
+        first = np.ones(len(pair), dtype=bool)
+        first[1:] = pair[1:] != pair[:-1]
+        complaint, rows, weight = complaint[order][first], rows[order][first], weight[order][first]
+
+        pairs, inverse = np.unique(complaint * n_rows + rows, return_inverse=True)
+        matched = np.bincount(inverse, weights=weight)
+        complaint, rows = pairs // n_rows, pairs % n_rows
+        score = np.minimum(
+            2 * matched / (np.array(complaint_weight)[complaint] + self.row_weight[rows]), 1.0)
+
+        good = score >= min_score
+        complaint, rows, score = complaint[good], rows[good], score[good]
+        order = np.lexsort((-score, complaint))
+        complaint, rows, score = complaint[order], rows[order], score[order]
+        # Ранг внутри жалобы, чтобы оставить top лучших
+        starts = np.flatnonzero(np.r_[True, complaint[1:] != complaint[:-1]])
+        rank = np.arange(len(complaint)) - np.repeat(starts, np.diff(np.r_[starts, len(complaint)]))
+        keep = rank < top
+        if ties:
+            best = np.repeat(score[starts], np.diff(np.r_[starts, len(complaint)]))
+            keep |= score >= best
+        return [
+            AddressMatch(c, a, s)
+            for c, a, s in zip(complaint[keep].tolist(), self.account_ids[rows[keep]].tolist(),
+                               score[keep].tolist())
+        ]
@@ -0,0 +1,38 @@
+import os
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+# Настройки пула асинхронного движка (переопределяются переменными окружения)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "10"))
+# Ограничение на время одного запроса в Postgres, мс (0 — без ограничения)
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+
+def sync_url(url: str) -> str:
+    """postgres://... (как в docker-compose) -> postgresql://..., который понимает SQLAlchemy."""
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def async_url(url: str) -> str:
+    url = sync_url(url)
+    scheme, rest = url.split("://", 1)
+    return "postgresql+asyncpg://" + rest if scheme.startswith("postgresql") else url
+
+
+def make_async_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        async_url(url),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=True,
+        connect_args={"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}},
+    )
+
+
+def make_session_factory(engine: AsyncEngine) -> async_sessionmaker:
+    return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
@@ -0,0 +1,139 @@
+"""Полнота и скорость сопоставления адресов жалоб с клиентами.
+
+Клиенты — в кадастровом формате, жалобы — как их пишут геокодеры и люди (Яндекс,
+Nominatim, свободный текст, опечатки). Сравниваются точное совпадение строки,
+совпадение address_key и AddressMatcher.
+
+Запуск из каталога ClientBack:
+    python -m benchmarks.bench_address_matcher --accounts 1000000 --complaints 100000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from address_keys import address_key
+from address_matcher import MIN_SCORE, AddressMatcher
+
+SYLLABLES = ["ка", "ли", "но", "ра", "ве", "зо", "мо", "ту", "ски", "ло", "де", "ни", "ма", "ро",
+             "го", "лу", "бе", "ти", "ко", "са", "пе", "ва", "ми", "до"]
+LOCALITY_TYPES = [("г", "город"), ("ст-ца", "станица"), ("пгт", "поселок городского типа"),
+                  ("х", "хутор"), ("с", "село")]
+STREET_TYPES = [("ул", "улица"), ("пер", "переулок"), ("пр-кт", "проспект")]
+
+
+def make_names(rng, count: int, suffix: str):
+    names = set()
+    while len(names) < count:
+        parts = rng.choice(SYLLABLES, size=rng.integers(2, 4))
+        names.add("".join(parts).capitalize() + suffix)
+    return sorted(names)
+
+
+def typo(rng, word: str) -> str:
+    i = int(rng.integers(1, len(word) - 1))
+    kind = rng.integers(0, 3)
+    if kind == 0:
+        return word[:i] + word[i + 1:]
+    if kind == 1:
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word[:i] + rng.choice(list("аеиоу")) + word[i + 1:]
+
+
+def make_data(accounts: int, complaints: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    districts = make_names(rng, 40, "ский")
+    localities = make_names(rng, 400, "")
+    streets = make_names(rng, 300, "ая")
+    houses = 120
+
+    # Уникальные (населённый пункт, улица, дом)
+    codes = rng.choice(len(localities) * len(streets) * houses, size=accounts, replace=False)
+    loc, rest = np.divmod(codes, len(streets) * houses)
+    street, house = np.divmod(rest, houses)
+    house = house + 1
+
+    addresses = []
+    for i in range(accounts):
+        locality_type = LOCALITY_TYPES[loc[i] % len(LOCALITY_TYPES)][0]
+        street_type = STREET_TYPES[street[i] % len(STREET_TYPES)][0]
+        addresses.append(
+            f"Краснодарский край, р-н {districts[loc[i] % len(districts)]}, "
+            f"{locality_type} {localities[loc[i]]}, {street_type} {streets[street[i]]}, д. {house[i]}")
+
+    targets = rng.choice(accounts, size=complaints, replace=False)
+    styles = rng.integers(0, 4, size=complaints)
+    texts = []
+    for row, style in zip(targets, styles):
+        locality, street_name, number = localities[loc[row]], streets[street[row]], house[row]
+        street_type = STREET_TYPES[street[row] % len(STREET_TYPES)][1]
+        if style == 0:
+            # Яндекс
+            texts.append(f"Россия, Краснодарский край, {locality}, {street_type} {street_name}, {number}")
+        elif style == 1:
+            # Nominatim
+            district = districts[loc[row] % len(districts)]
+            texts.append(f"{number}, {street_type} {street_name}, {locality}, {district} район, "
+                         f"Краснодарский край, 352000, Россия")
+        elif style == 2:
+            # Свободный текст без типа улицы
+            texts.append(f"{street_name} {number}, {locality}")
+        else:
+            # Опечатка в названии улицы
+            texts.append(f"{typo(rng, street_name)} {number} {locality}")
+    return np.arange(1, accounts + 1, dtype=np.int64), addresses, texts, targets + 1, styles
+
+
+def report(name: str, found: dict, expected, seconds: float) -> None:
+    correct = sum(found.get(i) == account for i, account in enumerate(expected))
+    returned = len(found)
+    precision = correct / returned if returned else 0.0
+    print(f"{name:<22} полнота {correct / len(expected):6.1%}  точность {precision:6.1%}  "
+          f"{seconds:7.2f} с  ({len(expected) / seconds:,.0f} жалоб/с)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=1_000_000)
+    parser.add_argument("--complaints", type=int, default=100_000)
+    parser.add_argument("--min-score", type=float, default=MIN_SCORE)
+    args = parser.parse_args()
+
+    print(f"Генерация {args.accounts} клиентов и {args.complaints} жалоб...")
+    account_ids, addresses, complaints, expected, styles = make_data(args.accounts, args.complaints)
+
+    started = time.perf_counter()
+    by_address = {address: account for address, account in zip(addresses, account_ids.tolist())}
+    found = {i: by_address[c] for i, c in enumerate(complaints) if c in by_address}
+    report("Точная строка", found, expected, time.perf_counter() - started)
+
+    started = time.perf_counter()
+    by_key = {address_key(address): account for address, account in zip(addresses, account_ids.tolist())}
+    found = {}
+    for i, complaint in enumerate(complaints):
+        account = by_key.get(address_key(complaint))
+        if account is not None:
+            found[i] = account
+    report("address_key", found, expected, time.perf_counter() - started)
+
+    started = time.perf_counter()
+    matcher = AddressMatcher(account_ids, addresses)
+    build_time = time.perf_counter() - started
+    print(f"Индекс AddressMatcher: {build_time:.2f} с, блоков-пар {len(matcher.keys):,}, "
+          f"слов {len(matcher.vocabulary):,}")
+
+    started = time.perf_counter()
+    matches = matcher.match(complaints, min_score=args.min_score)
+    match_time = time.perf_counter() - started
+    found = {m.complaint: m.account_id for m in matches}
+    report("AddressMatcher", found, expected, match_time)
+
+    names = ["Яндекс", "Nominatim", "свободный текст", "опечатка"]
+    for style, name in enumerate(names):
+        rows = np.flatnonzero(styles == style)
+        correct = sum(found.get(int(i)) == expected[i] for i in rows)
+        print(f"  {name:<18} полнота {correct / max(len(rows), 1):6.1%}")
+
+
+if __name__ == "__main__":
+    main()
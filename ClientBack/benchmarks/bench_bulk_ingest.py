@@ -0,0 +1,109 @@
+"""Сравнение загрузки клиентов через ORM и через COPY (/clients/batch и /clients/bulk).
+
+ORM — прежняя реализация /clients/batch (ClientDB на строку и add_all), выполняется
+в процессе бенчмарка на базе из DATABASE_URL. /clients/batch (JSON-массивы по
+BATCH_SIZE) и /clients/bulk (поток NDJSON) — запросы к запущенному clients.py на
+той же базе. Бенчмарк пишет клиентов с account_id, начиная с --id-offset; --wipe
+очищает всю таблицу clients после замера. Запуск из каталога ClientBack:
+    python -m benchmarks.bench_bulk_ingest --accounts 100000 --wipe
+"""
+import argparse
+import json
+import random
+import time
+
+import requests
+
+BATCH_SIZE = 5000
+
+
+def make_clients(n: int, offset: int, seed: int = 42):
+    rng = random.Random(seed)
+    for i in range(n):
+        yield {
+            "accountId": offset + i,
+            "isCommercial": rng.random() < 0.3,
+            "address": f"Краснодарский край, г Краснодар, ул Ленина, д. {i % 5000}",
+            "buildingType": rng.choice(["Частный", "Многоквартирный"]),
+            "roomsCount": rng.randint(1, 5),
+            "residentsCount": rng.randint(1, 6),
+            "totalArea": round(rng.uniform(20, 200), 1),
+            "consumption": {str(m): rng.randint(100, 9000) for m in range(1, 13)},
+        }
+
+
+def load_orm(clients):
+    from clients import ClientDB, SessionLocal
+
+    with SessionLocal() as db:
+        for start in range(0, len(clients), BATCH_SIZE):
+            db.add_all([
+                ClientDB(account_id=c["accountId"], is_commercial=c["isCommercial"], address=c["address"],
+                         building_type=c["buildingType"], rooms_count=c["roomsCount"],
+                         residents_count=c["residentsCount"], total_area=c["totalArea"],
+                         consumption=c["consumption"])
+                for c in clients[start:start + BATCH_SIZE]
+            ])
+            db.commit()
+
+
+def load_batch(base_url: str, clients):
+    for start in range(0, len(clients), BATCH_SIZE):
+        requests.post(f"{base_url}/clients/batch", json=clients[start:start + BATCH_SIZE]).raise_for_status()
+
+
+def ndjson_blocks(clients):
+    # Крупные куски: по строке на кусок requests делает слишком много мелких записей
+    return [
+        ("\n".join(json.dumps(c, ensure_ascii=False) for c in clients[start:start + BATCH_SIZE]) + "\n").encode()
+        for start in range(0, len(clients), BATCH_SIZE)
+    ]
+
+
+def load_bulk(base_url: str, blocks):
+    response = requests.post(f"{base_url}/clients/bulk", data=iter(blocks),
+                             headers={"Content-Type": "application/x-ndjson"})
+    response.raise_for_status()
+    return response.json()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--accounts", type=int, default=100_000)
+    parser.add_argument("--id-offset", type=int, default=900_000_000)
+    parser.add_argument("--wipe", action="store_true", help="удалить всех клиентов после замера")
+    args = parser.parse_args()
+
+    # Данные готовятся заранее, чтобы замер касался только сервера
+    orm_clients = list(make_clients(args.accounts, args.id_offset))
+    batch_clients = list(make_clients(args.accounts, args.id_offset + args.accounts))
+    bulk_blocks = ndjson_blocks(list(make_clients(args.accounts, args.id_offset + 2 * args.accounts)))
+
+    started = time.perf_counter()
+    load_orm(orm_clients)
+    orm_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    load_batch(args.base_url, batch_clients)
+    batch_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result = load_bulk(args.base_url, bulk_blocks)
+    bulk_time = time.perf_counter() - started
+
+    print(f"Клиентов: {args.accounts}")
+    print(f"ORM  add_all:        {orm_time:8.2f} с  ({args.accounts / orm_time:10.0f} строк/с)")
+    print(f"COPY /clients/batch: {batch_time:8.2f} с  ({args.accounts / batch_time:10.0f} строк/с)  "
+          f"x{orm_time / batch_time:.1f}")
+    print(f"COPY /clients/bulk:  {bulk_time:8.2f} с  ({args.accounts / bulk_time:10.0f} строк/с)  "
+          f"x{orm_time / bulk_time:.1f}")
+    print(f"Ответ /clients/bulk: merged={result['merged']} rejected={result['rejected']}")
+
+    if args.wipe:
+        print("Очистка таблицы clients...")
+        requests.delete(f"{args.base_url}/clients/").raise_for_status()
+
+
+if __name__ == "__main__":
+    main()
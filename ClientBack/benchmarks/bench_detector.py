@@ -0,0 +1,115 @@
+"""Сравнение построчного и векторного расчёта признаков и правил детектора.
+
+Запуск из каталога ClientBack:
+    python -m benchmarks.bench_detector --accounts 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from electricity_violation_detector import (
+    apply_rules, build_client_data, consumption_matrix, violators_from_rules,
+)
+
+STATUSES = [None, None, None, "no", "under_review", "yes"]
+
+
+def make_entries(n: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    consumption = rng.integers(200, 9000, size=(n, 12))
+    months_known = rng.integers(1, 13, size=n)
+    statuses = rng.integers(0, len(STATUSES), size=n)
+    commercial = rng.random(n) < 0.3
+    entries = []
+    for i in range(n):
+        known = int(months_known[i])
+        entries.append({
+            "account_id": i + 1,
+            "is_commercial": bool(commercial[i]),
+            "is_checked": STATUSES[statuses[i]],
+            "address": f"ул Ленина, д. {i % 5000}",
+            "residents_count": int(i % 5),
+            "rooms_count": int(i % 4),
+            "total_area": float(30 + i % 100),
+            "consumption": {str(m + 1): int(consumption[i, m]) for m in range(12 - known, 12)},
+        })
+    complaints = {f"ул Ленина, д. {k}" for k in range(0, 5000, 97)}
+    return entries, complaints
+
+
+def legacy(entries, complaints):
+    """Исходный построчный алгоритм load_data_from_api + detect_violators."""
+    X, addresses, full_data = [], [], []
+    for entry in entries:
+        consumption = list(entry["consumption"].values())
+        if len(consumption) < 3:
+            continue
+        last_months = consumption[-6:]
+        X.append([np.mean(last_months), np.max(last_months),
+                  entry["residents_count"], entry["rooms_count"], entry["total_area"]])
+        addresses.append(entry["address"])
+        full_data.append(entry)
+
+    violators = []
+    for i, entry in enumerate(full_data):
+        if entry["is_commercial"]:
+            continue
+        status = entry["is_checked"]
+        avg_6 = X[i][0]
+        if addresses[i] in complaints:
+            violators.append((entry["account_id"], "yellow", status if status else "no", float(avg_6)))
+        elif status in ["under_review", "no"]:
+            violators.append((entry["account_id"], "red" if avg_6 > 6000 else "yellow", status, float(avg_6)))
+        elif status is None and avg_6 > 3000:
+            violators.append((entry["account_id"], "red" if avg_6 > 6000 else "yellow", "no", float(avg_6)))
+    return violators
+
+
+def vectorized(entries, complaints):
+    columns = {
+        "account_id": np.array([e["account_id"] for e in entries], dtype=np.int64),
+        "residents_count": np.array([e["residents_count"] for e in entries], dtype=np.float64),
+        "rooms_count": np.array([e["rooms_count"] for e in entries], dtype=np.float64),
+        "total_area": np.array([e["total_area"] for e in entries], dtype=np.float64),
+        "is_commercial": np.array([e["is_commercial"] for e in entries], dtype=bool),
+        "is_checked": np.array([e["is_checked"] or "" for e in entries], dtype=str),
+        "address": np.array([e["address"] for e in entries], dtype=str),
+        "consumption": consumption_matrix([e["consumption"] for e in entries]),
+    }
+    started = time.perf_counter()
+    data = build_client_data(columns)
+    selected, priority, is_checked = apply_rules(data, np.isin(data.address, list(complaints)))
+    violators = violators_from_rules(data, selected, priority, is_checked)
+    return violators, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print(f"Генерация {args.accounts} клиентов...")
+    entries, complaints = make_entries(args.accounts)
+
+    started = time.perf_counter()
+    expected = legacy(entries, complaints)
+    legacy_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result, engine_time = vectorized(entries, complaints)
+    vectorized_time = time.perf_counter() - started
+
+    actual = [(v["accountId"], v["priority"], v["isChecked"], v["avgConsumption6m"]) for v in result]
+    assert len(actual) == len(expected), (len(actual), len(expected))
+    for a, e in zip(actual, expected):
+        assert a[:3] == e[:3] and abs(a[3] - e[3]) < 1e-6, (a, e)
+
+    print(f"Нарушителей: {len(actual)} (совпадает с построчным алгоритмом)")
+    print(f"Построчно:               {legacy_time:8.2f} с")
+    print(f"Векторно (с матрицей):   {vectorized_time:8.2f} с  x{legacy_time / vectorized_time:.1f}")
+    print(f"Векторно (признаки+правила): {engine_time:8.2f} с  x{legacy_time / engine_time:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Скоринг модели детектора в одном процессе и в пуле процессов (sharded_scoring.py).
+
+Модель обучается на случайных данных и сохраняется во временный ModelStore,
+затем скоры считаются model.predict в текущем процессе и пулом для каждого
+числа процессов из --workers. Скоры пула должны совпадать между собой
+и с однопроцессным расчётом.
+
+Запуск из каталога ClientBack:
+    python -m benchmarks.bench_scoring --accounts 2000000 --workers 1 4 8 16
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from electricity_violation_detector import train_model
+from model_store import ModelStore, data_fingerprint
+from sharded_scoring import SCORING_BATCH_SIZE, SCORING_CHUNK_SIZE, ShardedScorer
+
+
+def make_features(n: int, seed: int = 42) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    avg_6 = rng.uniform(200, 9000, n)
+    return np.column_stack([avg_6, avg_6 * rng.uniform(1, 1.5, n), rng.integers(0, 5, n),
+                            rng.integers(0, 4, n), rng.uniform(30, 130, n)])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--chunk-size", type=int, default=SCORING_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    X = make_features(args.accounts)
+    train_X = X[:20000]
+    y = (train_X[:, 0] > 3000).astype(int)
+    print("Обучение модели...")
+    model, scaler = train_model(train_X, y)
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        fingerprint = data_fingerprint(np.arange(len(train_X)), train_X, y)
+        ModelStore(model_dir).save(model, scaler, fingerprint, np.arange(len(train_X)), train_X, y)
+
+        started = time.perf_counter()
+        expected = model.predict(scaler.transform(X), batch_size=SCORING_BATCH_SIZE, verbose=0).ravel()
+        single_time = time.perf_counter() - started
+        print(f"Один процесс:      {single_time:8.2f} с")
+
+        for workers in args.workers:
+            scorer = ShardedScorer(model_dir, workers, args.chunk_size)
+            try:
+                # Первый вызов запускает процессы и загружает в них модель
+                started = time.perf_counter()
+                scorer.score(X[:args.chunk_size * workers], fingerprint)
+                warmup = time.perf_counter() - started
+
+                started = time.perf_counter()
+                scores = scorer.score(X, fingerprint)
+                elapsed = time.perf_counter() - started
+            finally:
+                scorer.close()
+            diff = float(np.max(np.abs(scores - expected)))
+            print(f"Процессов: {workers:3d}   {elapsed:8.2f} с  x{single_time / elapsed:.1f}  "
+                  f"(запуск {warmup:.1f} с, макс. расхождение {diff:.2e})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""Нагрузочный тест clients.py и over.py: опрос дашборда вместе с трафиком детектора.
+
+Запускает оба сервиса (uvicorn) на указанной тестовой базе Postgres, заливает
+--accounts синтетических клиентов в формате dataset_train.json и гоняет смешанную
+нагрузку --concurrency параллельными клиентами в течение --duration секунд:
+    list      GET  /clients?limit=100 с сортировкой и страницей по курсору
+    filter    GET  /clients с фильтрами по статусу и потреблению
+    export    GET  /clients/get?limit=1000 (страница выгрузки детектора)
+    over      GET  /over_consumers
+    patch     PATCH /clients/{id} (смена статуса проверки)
+    batch     POST /clients/batch на 100 новых клиентов
+    sync      POST /over_consumers/sync (детектор публикует нарушителей)
+    candidates GET /clients/candidates
+Доли операций задаются --mix, например list=40,filter=20,patch=10,sync=5.
+
+Отчёт — p50/p95/p99, среднее и пропускная способность по операциям, память
+(RSS) процессов сервисов. Результат пишется в JSON вместе с коммитом git, и его
+можно сравнить с прошлым прогоном через --compare.
+
+ВНИМАНИЕ: тест пишет в базу (patch, batch, sync перезаписывает over_consumers),
+поэтому --database-url должен указывать на отдельную тестовую базу. --wipe после
+замера удаляет всех клиентов и нарушителей.
+
+Запуск из каталога ClientBack:
+    python -m benchmarks.load_test --database-url postgresql://postgres@localhost/loadtest \\
+        --accounts 100000 --concurrency 32 --duration 60
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import aiohttp
+import numpy as np
+import requests
+
+from benchmarks.bench_bulk_ingest import load_bulk, make_clients, ndjson_blocks
+
+DEFAULT_MIX = "list=30,filter=20,export=10,over=10,patch=10,batch=5,sync=5,candidates=10"
+SORT_KEYS = ["account_id", "-avg_kwh", "address", "-updated_at"]
+STATUSES = [None, "no", "under_review", "yes"]
+BATCH_INSERT_SIZE = 100
+SYNC_SIZE = 2000
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    mix = {}
+    for part in text.split(","):
+        name, weight = part.split("=")
+        mix[name.strip()] = int(weight)
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise ValueError(f"Неизвестные операции: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def git_commit() -> Dict[str, object]:
+    def git(*args):
+        return subprocess.run(["git", *args], capture_output=True, text=True).stdout.strip()
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+class Service:
+    """Сервис uvicorn в отдельном процессе."""
+
+    def __init__(self, name: str, app: str, port: int, database_url: str, probe: str):
+        self.name = name
+        self.url = f"http://127.0.0.1:{port}"
+        env = {**os.environ, "DATABASE_URL": database_url}
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning"],
+            env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.probe = probe
+
+    def wait_ready(self, timeout: float = 300) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.name} завершился с кодом {self.process.returncode}")
+            try:
+                if requests.get(self.url + self.probe, timeout=2).ok:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.5)
+        raise RuntimeError(f"{self.name} не запустился за {timeout} с")
+
+    def stop(self) -> None:
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+class Workload:
+    def __init__(self, clients_url: str, over_url: str, seeded_ids: List[int], next_id: int, seed: int = 42):
+        self.clients_url = clients_url
+        self.over_url = over_url
+        self.seeded_ids = seeded_ids
+        self.next_id = next_id
+        self.rng = random.Random(seed)
+        # Курсоры страниц по сортировкам: курсор действителен только для своей сортировки
+        self.cursors: Dict[str, List[str]] = {sort: [] for sort in SORT_KEYS}
+
+    def new_ids(self, count: int) -> int:
+        start = self.next_id
+        self.next_id += count
+        return start
+
+
+async def op_list(w: Workload, session: aiohttp.ClientSession) -> int:
+    sort = w.rng.choice(SORT_KEYS)
+    cursors = w.cursors[sort]
+    params = {"limit": "100", "sort": sort}
+    if cursors and w.rng.random() < 0.5:
+        params["cursor"] = w.rng.choice(cursors)
+    async with session.get(f"{w.clients_url}/clients", params=params) as response:
+        body = await response.json()
+        if response.status == 200 and body.get("nextCursor") and len(cursors) < 1000:
+            cursors.append(body["nextCursor"])
+        return response.status
+
+
+async def op_filter(w: Workload, session: aiohttp.ClientSession) -> int:
+    params = {"is_commercial": "false", "min_consumption": str(w.rng.choice([1000, 3000, 6000])),
+              "is_checked": w.rng.choice(["not_checked", "no", "under_review"]), "limit": "100"}
+    async with session.get(f"{w.clients_url}/clients", params=params) as response:
+        await response.read()
+        return response.status
+
+
+async def op_export(w: Workload, session: aiohttp.ClientSession) -> int:
+    after = w.rng.choice(w.seeded_ids)
+    async with session.get(f"{w.clients_url}/clients/get", params={"limit": "1000", "after": str(after)}) as response:
+        await response.read()
+        return response.status
+
+
+async def op_over(w: Workload, session: aiohttp.ClientSession) -> int:
+    async with session.get(f"{w.over_url}/over_consumers") as response:
+        await response.read()
+        return response.status
+
+
+async def op_patch(w: Workload, session: aiohttp.ClientSession) -> int:
+    account_id = w.rng.choice(w.seeded_ids)
+    async with session.patch(f"{w.clients_url}/clients/{account_id}",
+                             json={"isChecked": w.rng.choice(STATUSES)}) as response:
+        await response.read()
+        return response.status
+
+
+async def op_batch(w: Workload, session: aiohttp.ClientSession) -> int:
+    clients = list(make_clients(BATCH_INSERT_SIZE, w.new_ids(BATCH_INSERT_SIZE), seed=w.rng.randrange(1 << 30)))
+    async with session.post(f"{w.clients_url}/clients/batch", json=clients) as response:
+        await response.read()
+        return response.status
+
+
+async def op_sync(w: Workload, session: aiohttp.ClientSession) -> int:
+    ids = w.rng.sample(w.seeded_ids, min(SYNC_SIZE, len(w.seeded_ids)))
+    payload = [{"accountId": i, "isChecked": w.rng.choice(["no", "under_review"]), "address": f"адрес {i}",
+                "priority": w.rng.choice(["red", "yellow"]), "avgConsumption6m": w.rng.uniform(3000, 9000)}
+               for i in ids]
+    async with session.post(f"{w.over_url}/over_consumers/sync", json=payload) as response:
+        await response.read()
+        return response.status
+
+
+async def op_candidates(w: Workload, session: aiohttp.ClientSession) -> int:
+    async with session.get(f"{w.clients_url}/clients/candidates") as response:
+        await response.read()
+        return response.status
+
+
+OPERATIONS = {
+    "list": op_list,
+    "filter": op_filter,
+    "export": op_export,
+    "over": op_over,
+    "patch": op_patch,
+    "batch": op_batch,
+    "sync": op_sync,
+    "candidates": op_candidates,
+}
+
+
+async def run_load(workload: Workload, mix: Dict[str, int], concurrency: int, duration: float,
+                   services: List[Service]) -> Dict[str, object]:
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples: Dict[str, List[float]] = {name: [] for name in names}
+    errors: Dict[str, int] = {name: 0 for name in names}
+    memory: Dict[str, List[float]] = {s.name: [] for s in services}
+    deadline = time.monotonic() + duration
+
+    async def worker(session: aiohttp.ClientSession) -> None:
+        while time.monotonic() < deadline:
+            name = workload.rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                status = await OPERATIONS[name](workload, session)
+                ok = status < 400
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                ok = False
+            samples[name].append(time.perf_counter() - started)
+            if not ok:
+                errors[name] += 1
+
+    async def sample_memory() -> None:
+        while time.monotonic() < deadline:
+            for service in services:
+                value = rss_mb(service.process.pid)
+                if value is not None:
+                    memory[service.name].append(value)
+            await asyncio.sleep(0.5)
+
+    timeout = aiohttp.ClientTimeout(total=120)
+    connector = aiohttp.TCPConnector(limit=concurrency * 2)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(sample_memory(), *(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    operations = {}
+    for name in names:
+        latencies = np.array(samples[name]) * 1000
+        operations[name] = {
+            "count": len(latencies),
+            "errors": errors[name],
+            "throughput": len(latencies) / elapsed,
+            **({"mean_ms": float(latencies.mean()),
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p95_ms": float(np.percentile(latencies, 95)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "max_ms": float(latencies.max())} if len(latencies) else {}),
+        }
+    total = sum(op["count"] for op in operations.values())
+    return {
+        "elapsed_seconds": elapsed,
+        "requests": total,
+        "throughput": total / elapsed,
+        "operations": operations,
+        "memory_mb": {name: {"peak": max(values), "last": values[-1]} if values else None
+                      for name, values in memory.items()},
+    }
+
+
+def print_report(result: Dict[str, object]) -> None:
+    print(f"\nЗапросов: {result['requests']}, {result['throughput']:.1f} запр/с "
+          f"за {result['elapsed_seconds']:.1f} с")
+    print(f"{'операция':<11} {'кол-во':>7} {'ошибки':>7} {'запр/с':>8} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8}")
+    for name, op in result["operations"].items():
+        if not op["count"]:
+            continue
+        print(f"{name:<11} {op['count']:>7} {op['errors']:>7} {op['throughput']:>8.1f} "
+              f"{op['p50_ms']:>8.1f} {op['p95_ms']:>8.1f} {op['p99_ms']:>8.1f}")
+    for name, memory in result["memory_mb"].items():
+        if memory:
+            print(f"Память {name}: пик {memory['peak']:.0f} МБ, в конце {memory['last']:.0f} МБ")
+
+
+def print_comparison(result: Dict[str, object], previous_path: str) -> None:
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)
+    print(f"\nСравнение с {previous_path} (коммит {previous['git']['commit'][:10]}):")
+    print(f"{'операция':<11} {'p95 было':>9} {'p95 стало':>10} {'изменение':>10}")
+    for name, op in result["operations"].items():
+        before = previous["result"]["operations"].get(name)
+        if not op["count"] or not before or not before.get("count"):
+            continue
+        change = (op["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+        print(f"{name:<11} {before['p95_ms']:>9.1f} {op['p95_ms']:>10.1f} {change:>+9.1f}%")
+    change = (result["throughput"] - previous["result"]["throughput"]) / previous["result"]["throughput"] * 100
+    print(f"Пропускная способность: {previous['result']['throughput']:.1f} -> {result['throughput']:.1f} запр/с "
+          f"({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database-url", help="тестовая база; сервисы запускаются на ней")
+    parser.add_argument("--clients-url", help="уже запущенный clients.py (вместо запуска)")
+    parser.add_argument("--over-url", help="уже запущенный over.py (вместо запуска)")
+    parser.add_argument("--clients-port", type=int, default=18000)
+    parser.add_argument("--over-port", type=int, default=18001)
+    parser.add_argument("--accounts", type=int, default=100_000)
+    parser.add_argument("--id-offset", type=int, default=900_000_000)
+    parser.add_argument("--no-seed", action="store_true", help="не заливать клиентов (уже залиты)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--output", help="файл JSON с результатом (по умолчанию benchmarks/results/...)")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--wipe", action="store_true", help="удалить клиентов и нарушителей после замера")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    if not (args.clients_url and args.over_url) and not args.database_url:
+        parser.error("нужен --database-url (тестовая база) или --clients-url и --over-url")
+
+    services: List[Service] = []
+    try:
+        if args.clients_url and args.over_url:
+            clients_url, over_url = args.clients_url.rstrip("/"), args.over_url.rstrip("/")
+        else:
+            services = [
+                Service("clients", "clients:app", args.clients_port, args.database_url, "/clients/cache/stats"),
+                Service("over", "over:app", args.over_port, args.database_url, "/openapi.json"),
+            ]
+            for service in services:
+                service.wait_ready()
+            clients_url, over_url = services[0].url, services[1].url
+
+        seeded_ids = list(range(args.id_offset, args.id_offset + args.accounts))
+        if not args.no_seed:
+            print(f"Заливка {args.accounts} клиентов...")
+            started = time.perf_counter()
+            load_bulk(clients_url, ndjson_blocks(list(make_clients(args.accounts, args.id_offset))))
+            print(f"Залито за {time.perf_counter() - started:.1f} с")
+
+        # Новые клиенты для batch — после самого большого account_id в базе
+        response = requests.get(f"{clients_url}/clients",
+                                params={"sort": "-account_id", "limit": "1", "fields": "account_id"})
+        response.raise_for_status()
+        last = response.json()["clients"]
+        next_id = max(args.id_offset + args.accounts, last[0]["account_id"] + 1 if last else 0)
+        workload = Workload(clients_url, over_url, seeded_ids, next_id)
+        print(f"Нагрузка: {args.concurrency} параллельных клиентов, {args.duration:.0f} с, смесь {args.mix}")
+        result = asyncio.run(run_load(workload, mix, args.concurrency, args.duration, services))
+        print_report(result)
+
+        report = {
+            "git": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "params": {"accounts": args.accounts, "concurrency": args.concurrency, "duration": args.duration,
+                       "mix": mix},
+            "result": result,
+        }
+        output = args.output
+        if output is None:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            output = os.path.join(RESULTS_DIR, f"load_test-{report['git']['commit'][:10]}-{stamp}.json")
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультат: {output}")
+        if args.compare:
+            print_comparison(result, args.compare)
+
+        if args.wipe:
+            print("Очистка clients и over_consumers...")
+            requests.delete(f"{clients_url}/clients/").raise_for_status()
+            requests.delete(f"{over_url}/over_consumers").raise_for_status()
+    finally:
+        for service in services:
+            service.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+import csv
+import io
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import psycopg2
+
+# Колонки clients в порядке COPY
+COLUMNS = ("account_id", "is_checked", "is_commercial", "address", "building_type",
+           "rooms_count", "residents_count", "total_area", "consumption", "priority")
+
+# Принимаем и camelCase (как /clients/import), и snake_case (как /clients/get)
+FIELD_MAPPING = {
+    "accountId": "account_id",
+    "isChecked": "is_checked",
+    "isCommercial": "is_commercial",
+    "address": "address",
+    "buildingType": "building_type",
+    "roomsCount": "rooms_count",
+    "residentsCount": "residents_count",
+    "totalArea": "total_area",
+    "consumption": "consumption",
+    "priority": "priority",
+}
+FIELD_MAPPING.update({column: column for column in COLUMNS})
+
+STAGING_DDL = """
+CREATE TEMP TABLE IF NOT EXISTS clients_staging (
+    line_no BIGINT NOT NULL,
+    account_id INTEGER NOT NULL,
+    is_checked VARCHAR,
+    is_commercial BOOLEAN,
+    address VARCHAR,
+    building_type VARCHAR,
+    rooms_count INTEGER,
+    residents_count INTEGER,
+    total_area DOUBLE PRECISION,
+    consumption JSON,
+    priority TEXT
+) ON COMMIT DELETE ROWS
+"""
+
+# Дубликаты account_id внутри пачки — побеждает последняя строка
+DEDUPE_SQL = """
+DELETE FROM clients_staging s
+USING clients_staging t
+WHERE s.account_id = t.account_id AND s.line_no < t.line_no
+"""
+
+# Поля, которых не было во входных данных (NULL), не затирают уже сохранённые значения:
+# например, выгрузка показаний не сбрасывает is_checked, выставленный проверяющим.
+_UPDATES = ",\n    ".join(
+    f"{c} = COALESCE({{source}}.{c}, clients.{c})" for c in COLUMNS if c != "account_id")
+
+# Строка меняется (и получает новый version), только если после слияния отличается
+# хотя бы одно поле: повторная выгрузка тех же данных не будит ленту изменений.
+# У json нет оператора равенства — consumption сравнивается как jsonb.
+def _changed(source: str) -> str:
+    def cast(c):
+        return "::jsonb" if c == "consumption" else ""
+    merged = ", ".join(f"COALESCE({source}.{c}, clients.{c}){cast(c)}" for c in COLUMNS if c != "account_id")
+    current = ", ".join(f"clients.{c}{cast(c)}" for c in COLUMNS if c != "account_id")
+    return f"({merged}) IS DISTINCT FROM ({current})"
+
+
+UPDATE_SQL = """
+UPDATE clients SET
+    {updates},
+    version = nextval('clients_version_seq'),
+    updated_at = now()
+FROM clients_staging s
+WHERE clients.account_id = s.account_id
+  AND {changed}
+""".format(updates=_UPDATES.format(source="s"), changed=_changed("s"))
+
+# Новые клиенты. ON CONFLICT страхует от параллельной вставки того же account_id
+INSERT_SQL = """
+INSERT INTO clients ({columns}, version, updated_at)
+SELECT {staged}, nextval('clients_version_seq'), now()
+FROM clients_staging s
+WHERE NOT EXISTS (SELECT 1 FROM clients c WHERE c.account_id = s.account_id)
+ON CONFLICT (account_id) DO UPDATE SET
+    {updates},
+    version = EXCLUDED.version,
+    updated_at = EXCLUDED.updated_at
+WHERE {changed}
+""".format(
+    columns=", ".join(COLUMNS),
+    staged=", ".join("COALESCE(is_commercial, FALSE)" if c == "is_commercial" else c for c in COLUMNS),
+    updates=_UPDATES.format(source="EXCLUDED"),
+    changed=_changed("EXCLUDED"),
+)
+
+
+def _as_int(value: Any, field: str) -> Optional[int]:
+    if type(value) is int:
+        return value
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"{field}: ожидалось целое число")
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(f"{field}: ожидалось целое число")
+        return int(value)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field}: ожидалось целое число, получено {value!r}")
+
+
+def _as_float(value: Any, field: str) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field}: ожидалось число, получено {value!r}")
+
+
+def _as_bool(value: Any, field: str) -> Optional[bool]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ("true", "t", "1", "yes"):
+        return True
+    if isinstance(value, str) and value.lower() in ("false", "f", "0", "no"):
+        return False
+    raise ValueError(f"{field}: ожидалось true/false, получено {value!r}")
+
+
+def _as_str(value: Any, field: str) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, (dict, list)):
+        raise ValueError(f"{field}: ожидалась строка")
+    return str(value)
+
+
+MONTH_KEYS = frozenset(str(month) for month in range(1, 13))
+
+
+def _as_consumption(value: Any) -> Optional[Dict[str, int]]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise ValueError("consumption: некорректный JSON")
+    if not isinstance(value, dict):
+        raise ValueError("consumption: ожидался объект {\"1\": ..., \"12\": ...}")
+    # Обычный случай — ключи "1".."12" и целые значения, их можно взять как есть
+    if MONTH_KEYS.issuperset(value) and all(type(kwh) is int for kwh in value.values()):
+        return value
+    result = {}
+    for month, kwh in value.items():
+        if not str(month).isdigit() or not 1 <= int(month) <= 12:
+            raise ValueError(f"consumption: некорректный месяц {month!r}")
+        result[str(int(month))] = _as_int(kwh, "consumption")
+    return result
+
+
+def parse_record(record: Dict[str, Any]) -> Tuple:
+    """Проверяет одну запись и возвращает кортеж значений в порядке COLUMNS."""
+    if not isinstance(record, dict):
+        raise ValueError("запись должна быть JSON-объектом")
+    data = {}
+    for key, value in record.items():
+        column = FIELD_MAPPING.get(key)
+        if column is not None:
+            data[column] = value
+
+    account_id = _as_int(data.get("account_id"), "accountId")
+    if account_id is None:
+        raise ValueError("Missing required field: accountId")
+
+    return (
+        account_id,
+        _as_str(data.get("is_checked"), "isChecked"),
+        _as_bool(data.get("is_commercial"), "isCommercial"),
+        _as_str(data.get("address"), "address"),
+        _as_str(data.get("building_type"), "buildingType"),
+        _as_int(data.get("rooms_count"), "roomsCount"),
+        _as_int(data.get("residents_count"), "residentsCount"),
+        _as_float(data.get("total_area"), "totalArea"),
+        _as_consumption(data.get("consumption")),
+        _as_str(data.get("priority"), "priority"),
+    )
+
+
+class LineSplitter:
+    """Режет поток байтов, пришедший произвольными кусками, на строки.
+
+    feed() и finish() возвращают пары (номер строки с 1, текст без перевода строки).
+    """
+
+    def __init__(self):
+        self.buffer = b""
+        self.line_no = 0
+
+    def _decode(self, line: bytes) -> Tuple[int, str]:
+        self.line_no += 1
+        return self.line_no, line.decode("utf-8").rstrip("\r")
+
+    def feed(self, chunk: bytes) -> List[Tuple[int, str]]:
+        *lines, self.buffer = (self.buffer + chunk).split(b"\n")
+        return [self._decode(line) for line in lines]
+
+    def finish(self) -> List[Tuple[int, str]]:
+        tail, self.buffer = self.buffer, b""
+        return [self._decode(tail)] if tail.strip() else []
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[Tuple[int, str]]:
+    splitter = LineSplitter()
+    for chunk in chunks:
+        yield from splitter.feed(chunk)
+    yield from splitter.finish()
+
+
+def parse_ndjson_line(text: str) -> Dict[str, Any]:
+    try:
+        return json.loads(text)
+    except ValueError as e:
+        raise ValueError(f"некорректный JSON: {e}")
+
+
+class CsvLineParser:
+    """CSV с заголовком; consumption — JSON-объект в одной ячейке. Одна запись на строку."""
+
+    def __init__(self):
+        self.header: Optional[List[str]] = None
+
+    def parse(self, text: str) -> Optional[Dict[str, Any]]:
+        values = next(csv.reader([text]))
+        if self.header is None:
+            self.header = values
+            return None
+        if len(values) != len(self.header):
+            raise ValueError(f"ожидалось {len(self.header)} колонок, получено {len(values)}")
+        # Пустая ячейка — поля нет (NULL), а не пустая строка
+        return {key: value if value != "" else None for key, value in zip(self.header, values)}
+
+
+def _copy_value(value: Any) -> str:
+    if type(value) is int or type(value) is float:
+        return str(value)
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, dict):
+        value = json.dumps(value, ensure_ascii=False)
+    value = str(value)
+    if "\\" in value or "\t" in value or "\n" in value or "\r" in value:
+        value = (value.replace("\\", "\\\\").replace("\t", "\\t")
+                 .replace("\n", "\\n").replace("\r", "\\r"))
+    return value
+
+
+class BulkLoader:
+    """Загрузка клиентов через COPY во временную таблицу и слияние с ON CONFLICT.
+
+    Каждая пачка (load_chunk) — отдельная транзакция: COPY в clients_staging,
+    UPDATE существующих клиентов и INSERT ... ON CONFLICT новых. Временная таблица
+    очищается сама при коммите (ON COMMIT DELETE ROWS).
+
+    Если база отвергает пачку из-за данных (значение вне диапазона типа, нарушение
+    ограничения), пачка делится пополам и половины загружаются отдельно, пока
+    ошибка не сузится до одной строки: она отклоняется, остальные загружаются.
+    """
+
+    def __init__(self, connection):
+        # connection — DBAPI-соединение psycopg2 (например, engine.raw_connection())
+        self.connection = connection
+        with self.connection.cursor() as cur:
+            cur.execute(STAGING_DDL)
+        self.connection.commit()
+
+    def load_chunk(self, rows: List[Tuple[int, Tuple]]) -> Tuple[int, List[Tuple[int, str]]]:
+        """rows — пары (номер строки, кортеж из parse_record).
+
+        Возвращает (число добавленных и изменённых клиентов, [(номер строки, ошибка)]).
+        """
+        if not rows:
+            return 0, []
+        try:
+            return self._merge(rows), []
+        except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+            if len(rows) == 1:
+                return 0, [(rows[0][0], str(e).strip().splitlines()[0])]
+            middle = len(rows) // 2
+            merged, rejects = self.load_chunk(rows[:middle])
+            more, more_rejects = self.load_chunk(rows[middle:])
+            return merged + more, rejects + more_rejects
+
+    def _merge(self, rows: List[Tuple[int, Tuple]]) -> int:
+        buffer = io.StringIO()
+        for line_no, values in rows:
+            buffer.write(str(line_no))
+            for value in values:
+                buffer.write("\t")
+                buffer.write(_copy_value(value))
+            buffer.write("\n")
+        buffer.seek(0)
+
+        try:
+            with self.connection.cursor() as cur:
+                cur.copy_expert(
+                    f"COPY clients_staging (line_no, {', '.join(COLUMNS)}) FROM STDIN", buffer)
+                cur.execute(DEDUPE_SQL)
+                cur.execute(UPDATE_SQL)
+                merged = cur.rowcount
+                cur.execute(INSERT_SQL)
+                merged += cur.rowcount
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        return merged
+
+    def close(self):
+        self.connection.close()
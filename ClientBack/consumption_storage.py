@@ -0,0 +1,89 @@
+"""Нормализованное хранение помесячного потребления.
+
+clients.consumption остаётся источником данных (JSON {"1": ..., "12": ...}), а база
+сама поддерживает по нему колонки в той же строке clients:
+  * monthly_kwh — массив из 12 чисел по месяцам (NULL — нет показаний);
+  * months_count, annual_kwh, avg_kwh — число месяцев, сумма и среднее;
+  * avg_6m, max_6m — среднее и максимум по последним шести месяцам с показаниями,
+    как в детекторе (consumption_features), и только если месяцев не меньше трёх.
+
+Всё считает один BEFORE-триггер на строку, поэтому колонки актуальны при любой
+записи — ORM, /clients/bulk и bulk_loader.py. Строки, записанные до появления
+триггера, досчитывает migrate.py.
+"""
+from db_schema import create_trigger
+
+AGGREGATES_FUNCTION = r"""
+CREATE OR REPLACE FUNCTION clients_consumption_aggregates() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    kwh double precision[] := array_fill(NULL::double precision, ARRAY[12]);
+    item record;
+    month integer;
+    reading double precision;
+    total integer := 0;
+    recent integer := 0;
+    annual double precision;
+    recent_sum double precision;
+    recent_max double precision;
+BEGIN
+    -- Нечисловые значения и месяцы вне 1..12 пропускаются, а не роняют запись
+    IF json_typeof(NEW.consumption) = 'object' THEN
+        FOR item IN SELECT * FROM json_each_text(NEW.consumption) LOOP
+            IF item.key ~ '^[0-9]{1,2}$' AND item.value ~ '^-?[0-9]+(\.[0-9]+)?([eE][-+]?[0-9]+)?$' THEN
+                month := item.key::integer;
+                IF month BETWEEN 1 AND 12 THEN
+                    kwh[month] := item.value::double precision;
+                END IF;
+            END IF;
+        END LOOP;
+    ELSIF json_typeof(NEW.consumption) = 'array' THEN
+        month := 0;
+        FOR item IN SELECT * FROM json_array_elements_text(NEW.consumption) LOOP
+            month := month + 1;
+            EXIT WHEN month > 12;
+            IF item.value ~ '^-?[0-9]+(\.[0-9]+)?([eE][-+]?[0-9]+)?$' THEN
+                kwh[month] := item.value::double precision;
+            END IF;
+        END LOOP;
+    END IF;
+
+    FOR month IN REVERSE 12..1 LOOP
+        reading := kwh[month];
+        CONTINUE WHEN reading IS NULL;
+        total := total + 1;
+        annual := coalesce(annual, 0) + reading;
+        IF recent < 6 THEN
+            recent := recent + 1;
+            recent_sum := coalesce(recent_sum, 0) + reading;
+            recent_max := greatest(recent_max, reading);
+        END IF;
+    END LOOP;
+
+    NEW.monthly_kwh := kwh;
+    NEW.months_count := total;
+    NEW.annual_kwh := annual;
+    NEW.avg_kwh := annual / nullif(total, 0);
+    NEW.avg_6m := CASE WHEN total >= 3 THEN recent_sum / recent END;
+    NEW.max_6m := CASE WHEN total >= 3 THEN recent_max END;
+    RETURN NEW;
+END
+$$
+"""
+
+TRIGGER = """
+CREATE OR REPLACE TRIGGER clients_consumption_aggregates
+BEFORE INSERT OR UPDATE OF consumption ON clients
+FOR EACH ROW EXECUTE FUNCTION clients_consumption_aggregates()
+"""
+
+# Досчёт строк, записанных до появления триггера (migrate.py): UPDATE самого
+# consumption запускает триггер
+BACKFILL_SET = "consumption = consumption"
+BACKFILL_WHERE = "months_count IS NULL"
+
+
+def ensure_consumption_storage(conn) -> bool:
+    """Создаёт функцию и, если его ещё нет, триггер. True, если триггер создан."""
+    conn.exec_driver_sql(AGGREGATES_FUNCTION)
+    return create_trigger(conn, "clients", "clients_consumption_aggregates", TRIGGER)
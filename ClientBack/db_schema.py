@@ -0,0 +1,57 @@
+"""Досоздание схемы без лишних блокировок.
+
+ALTER TABLE ... ADD COLUMN IF NOT EXISTS и CREATE [OR REPLACE] TRIGGER блокируют
+таблицу при каждом вызове, даже если менять нечего (ALTER TABLE — ACCESS EXCLUSIVE,
+то есть ждёт и останавливает даже чтение; CREATE INDEX IF NOT EXISTS — SHARE,
+останавливает запись). Схема досоздаётся при каждом старте
+сервиса, поэтому сначала проверяется системный каталог, и DDL выполняется только
+для того, чего в базе ещё нет.
+
+Триггер проверяется по имени: если меняется его определение (события, колонки),
+а не тело функции, триггер нужно переименовать. Тело функции обновляет
+CREATE OR REPLACE FUNCTION — он таблицу не блокирует.
+"""
+from sqlalchemy import text
+
+
+def relation_exists(conn, name: str) -> bool:
+    """Таблица или индекс с таким именем."""
+    return conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+
+
+def column_exists(conn, table: str, column: str) -> bool:
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_attribute "
+        "WHERE attrelid = to_regclass(:table) AND attname = :column AND NOT attisdropped)"),
+        {"table": table, "column": column}).scalar()
+
+
+def trigger_exists(conn, table: str, name: str) -> bool:
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_trigger "
+        "WHERE tgrelid = to_regclass(:table) AND tgname = :name AND NOT tgisinternal)"),
+        {"table": table, "name": name}).scalar()
+
+
+def add_column(conn, table: str, column: str, definition: str) -> bool:
+    """Добавляет колонку, если её нет. True, если колонка добавлена."""
+    if column_exists(conn, table, column):
+        return False
+    conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {definition}")
+    return True
+
+
+def create_trigger(conn, table: str, name: str, statement: str) -> bool:
+    """Выполняет statement (CREATE OR REPLACE TRIGGER name ...), если триггера нет. True, если создан."""
+    if trigger_exists(conn, table, name):
+        return False
+    conn.exec_driver_sql(statement)
+    return True
+
+
+def create_relation(conn, name: str, statement: str) -> bool:
+    """Выполняет statement (CREATE TABLE/INDEX IF NOT EXISTS name ...), если name нет. True, если создано."""
+    if relation_exists(conn, name):
+        return False
+    conn.exec_driver_sql(statement)
+    return True
@@ -1,70 +1,224 @@
+import io
+import json
+import os
 import numpy as np
 import tensorflow as tf
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 import requests
-from typing import Tuple, List, Dict, Optional
+from typing import Tuple, List, Dict, Optional, NamedTuple
 import time
-import psycopg2  # Импорт для работы с PostgreSQL
+
+from model_store import ModelStore, StoredModel, data_fingerprint, changed_rows
+from sharded_scoring import SCORING_BATCH_SIZE, SCORING_MIN_ROWS, SCORING_WORKERS, score_in_pool
 
 # Конфигурация API
 CLIENTS_API_URL = "http://127.0.0.1:8000/clients/get"
-OVER_CONSUMERS_API_URL = "http://127.0.0.1:8001/over_consumers/batch"
-
-# Конфигурация БД PostgreSQL (поменяй на свои данные)
-DB_HOST = "127.0.0.1"
-DB_PORT = 5432
-DB_NAME = "postgres"
-DB_USER = "postgres"
-DB_PASSWORD = "141722"
-
-
-def load_data_from_api() -> Tuple[Optional[np.ndarray], Optional[np.ndarray], List[str], List[Dict]]:
+CLIENTS_EXPORT_URL = "http://127.0.0.1:8000/clients/export.npz"
+CLIENTS_CHANGES_URL = "http://127.0.0.1:8000/clients/changes"
+CLIENTS_CANDIDATES_URL = "http://127.0.0.1:8000/clients/candidates"
+COMPLAINT_MATCHES_URL = "http://127.0.0.1:8000/clients/complaint-matches"
+LISTING_MATCHES_URL = "http://127.0.0.1:8000/clients/listing-matches"
+OVER_CONSUMERS_SYNC_URL = "http://127.0.0.1:8001/over_consumers/sync"
+
+# Загружать клиентов колоночной выгрузкой (.npz) вместо JSON
+USE_COLUMNAR_EXPORT = True
+
+# full — каждый цикл загружает и оценивает всех клиентов,
+# incremental — только изменившихся (через /clients/changes),
+# candidates — только кандидатов, отобранных правилами в базе (через /clients/candidates)
+DETECTOR_MODE = os.environ.get("DETECTOR_MODE", "full")
+# Раз в столько циклов инкрементальный режим делает полную синхронизацию
+INCREMENTAL_RESYNC_CYCLES = 360
+# Раз в столько циклов режим candidates загружает всех клиентов и обновляет модель
+CANDIDATES_RETRAIN_CYCLES = 360
+
+# Сопоставлять жалобы с клиентами и по похожим адресам (опечатки, другой формат
+# адреса), а не только по совпадению нормализованного ключа
+FUZZY_COMPLAINT_MATCHING = os.environ.get("FUZZY_COMPLAINT_MATCHING", "1") == "1"
+COMPLAINT_MIN_SCORE = float(os.environ.get("COMPLAINT_MIN_SCORE", "0.6"))
+
+# Дообучать сохранённую модель, если изменилось не больше этой доли клиентов,
+# иначе обучать заново
+FINE_TUNE_MAX_FRACTION = 0.2
+FINE_TUNE_EPOCHS = 3
+
+
+MONTHS = 12
+OPEN_STATUSES = ["under_review", "no"]
+SUSPECT_THRESHOLD = 3000
+RED_THRESHOLD = 6000
+# Модель оценивает вероятность того, что потребление коммерческое (y = is_commercial).
+# Отобранный правилами бытовой клиент с оценкой не ниже порога получает приоритет red
+COMMERCIAL_SCORE_THRESHOLD = float(os.environ.get("COMMERCIAL_SCORE_THRESHOLD", "0.8"))
+
+
+class ClientData(NamedTuple):
+    """Клиенты, прошедшие фильтр по числу месяцев, в виде колонок.
+
+    is_checked — строки, "" означает «ещё не проверялся» (NULL в БД).
+    X — признаки модели: avg_6, max_6, residents_count, rooms_count, total_area.
+    """
+    account_id: np.ndarray
+    is_commercial: np.ndarray
+    is_checked: np.ndarray
+    address: np.ndarray
+    X: np.ndarray
+
+    @property
+    def avg_6(self) -> np.ndarray:
+        return self.X[:, 0]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self.is_commercial.astype(int)
+
+
+def consumption_features(consumption: np.ndarray, window: int = 6,
+                         min_months: int = 3) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Среднее и максимум за последние `window` известных месяцев для матрицы N x 12.
+
+    Пропуски (NaN) сдвигаются в начало строки с сохранением порядка остальных
+    месяцев — так окно совпадает с `list(consumption.values())[-6:]` из JSON.
+    Возвращает (mask, avg, max), где mask отмечает строки с >= min_months значений,
+    а avg/max посчитаны только для них.
+    """
+    present = ~np.isnan(consumption)
+    mask = present.sum(axis=1) >= min_months
+    order = np.argsort(present[mask], axis=1, kind="stable")
+    last = np.take_along_axis(consumption[mask], order, axis=1)[:, -window:]
+    return mask, np.nanmean(last, axis=1), np.nanmax(last, axis=1)
+
+
+def consumption_matrix(values: List) -> np.ndarray:
+    """Матрица N x 12 из consumption в формате JSON ({"1": ..., "12": ...} или списка)."""
+    matrix = np.full((len(values), MONTHS), np.nan)
+    for i, consumption in enumerate(values):
+        if isinstance(consumption, dict):
+            for month, value in consumption.items():
+                if value is not None and 1 <= int(month) <= MONTHS:
+                    matrix[i, int(month) - 1] = value
+        elif consumption:
+            row = [np.nan if value is None else value for value in consumption[:MONTHS]]
+            matrix[i, :len(row)] = row
+    return matrix
+
+
+def build_client_data(columns: Dict[str, np.ndarray]) -> Optional[ClientData]:
+    """Считает признаки по колонкам выгрузки одним векторным проходом."""
+    mask, avg_6, max_6 = consumption_features(columns["consumption"])
+    if not mask.any():
+        return None
+
+    X = np.column_stack([
+        avg_6,
+        max_6,
+        np.nan_to_num(columns["residents_count"][mask]),
+        np.nan_to_num(columns["rooms_count"][mask]),
+        np.nan_to_num(columns["total_area"][mask]),
+    ])
+    return ClientData(
+        account_id=columns["account_id"][mask],
+        is_commercial=columns["is_commercial"][mask],
+        is_checked=columns["is_checked"][mask],
+        address=columns["address"][mask],
+        X=X,
+    )
+
+
+def _nullable_floats(values: List) -> np.ndarray:
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+CLIENT_FIELDS = ("account_id", "residents_count", "rooms_count", "total_area",
+                 "is_commercial", "is_checked", "address", "consumption")
+
+
+def columns_from_entries(entries: List[Dict]) -> Dict[str, np.ndarray]:
+    """Колонки в формате выгрузки .npz из записей клиентов в JSON."""
+    raw = {name: [entry.get(name) for entry in entries] for name in CLIENT_FIELDS}
+    return {
+        "account_id": np.array(raw["account_id"], dtype=np.int64),
+        "residents_count": _nullable_floats(raw["residents_count"]),
+        "rooms_count": _nullable_floats(raw["rooms_count"]),
+        "total_area": _nullable_floats(raw["total_area"]),
+        "is_commercial": np.array([bool(v) for v in raw["is_commercial"]], dtype=bool),
+        "is_checked": np.array([v or "" for v in raw["is_checked"]], dtype=str),
+        "address": np.array([v or "" for v in raw["address"]], dtype=str),
+        "consumption": consumption_matrix(raw["consumption"]),
+    }
+
+
+def load_data_from_api() -> Optional[ClientData]:
     try:
-        response = requests.get(CLIENTS_API_URL)
+        # NDJSON-поток: клиенты разбираются по мере прихода, без одного огромного ответа
+        response = requests.get(CLIENTS_API_URL, params={"format": "ndjson"}, stream=True)
         response.raise_for_status()
-        raw_data = response.json().get("clients", [])
 
-        if not raw_data:
+        entries = [json.loads(line) for line in response.iter_lines() if line]
+        if not entries:
             print("Получены пустые данные от API")
-            return None, None, [], []
+            return None
 
-        X, y, addresses, full_data = [], [], [], []
-        for entry in raw_data:
-            consumption = entry.get("consumption", {})
-
-            if isinstance(consumption, dict):
-                consumption = list(consumption.values())
+        data = build_client_data(columns_from_entries(entries))
+        if data is None:
+            print("Нет данных, удовлетворяющих условиям после фильтрации")
+        return data
 
-            if not consumption or len(consumption) < 3:
-                continue
+    except Exception as e:
+        print(f"Ошибка при загрузке данных: {e}")
+        return None
 
-            last_months = consumption[-6:]
-            avg_6 = np.mean(last_months)
 
-            features = [
-                avg_6,
-                np.max(last_months),
-                entry.get("residents_count", 0),
-                entry.get("rooms_count", 0),
-                entry.get("total_area", 0)
-            ]
-            X.append(features)
-            y.append(1 if entry.get("is_commercial") else 0)
-            addresses.append(entry.get("address", ""))
+def load_data_from_export() -> Optional[ClientData]:
+    try:
+        response = requests.get(CLIENTS_EXPORT_URL)
+        response.raise_for_status()
+        columns = dict(np.load(io.BytesIO(response.content)))
 
-            entry['avg_consumption_6m'] = avg_6
-            full_data.append(entry)
+        if not len(columns["account_id"]):
+            print("Получены пустые данные от API")
+            return None
 
-        if not X:
+        data = build_client_data(columns)
+        if data is None:
             print("Нет данных, удовлетворяющих условиям после фильтрации")
-            return None, None, [], []
-
-        return np.array(X), np.array(y), addresses, full_data
+        return data
 
     except Exception as e:
         print(f"Ошибка при загрузке данных: {e}")
-        return None, None, [], []
+        return None
+
+
+def load_candidates() -> Optional[Tuple[ClientData, np.ndarray, np.ndarray]]:
+    """Кандидаты из /clients/candidates и маски совпадения адреса с жалобами и с объявлениями гостиниц.
+
+    Признаки avg_6/max_6 уже посчитаны базой (avg_6m/max_6m), поэтому помесячные
+    показания не загружаются.
+    """
+    response = requests.get(CLIENTS_CANDIDATES_URL,
+                            params={"threshold": SUSPECT_THRESHOLD, "statuses": OPEN_STATUSES,
+                                    **_complaint_match_params()})
+    response.raise_for_status()
+    columns = response.json()
+    if not columns["account_id"]:
+        return None
+
+    X = np.column_stack([
+        _nullable_floats(columns["avg_6m"]),
+        _nullable_floats(columns["max_6m"]),
+        np.nan_to_num(_nullable_floats(columns["residents_count"])),
+        np.nan_to_num(_nullable_floats(columns["rooms_count"])),
+        np.nan_to_num(_nullable_floats(columns["total_area"])),
+    ])
+    data = ClientData(
+        account_id=np.array(columns["account_id"], dtype=np.int64),
+        is_commercial=np.zeros(len(X), dtype=bool),
+        is_checked=np.array([v or "" for v in columns["is_checked"]], dtype=str),
+        address=np.array([v or "" for v in columns["address"]], dtype=str),
+        X=X,
+    )
+    return data, np.array(columns["by_complaint"], dtype=bool), np.array(columns["by_listing"], dtype=bool)
 
 
 def train_model(X: np.ndarray, y: np.ndarray) -> Tuple[tf.keras.Model, StandardScaler]:
@@ -100,126 +254,472 @@ def train_model(X: np.ndarray, y: np.ndarray) -> Tuple[tf.keras.Model, StandardS
         raise
 
 
-def load_complaints_addresses() -> List[str]:
+model_store = ModelStore()
+_current_model: Optional[StoredModel] = None
+
+
+def get_model(data: ClientData) -> Tuple[tf.keras.Model, StandardScaler]:
+    """Модель для текущего набора клиентов.
+
+    Если данные не менялись с прошлого цикла — используется сохранённая модель
+    без обучения. Если изменилась небольшая часть клиентов — модель дообучается
+    только на них, иначе обучается заново.
+    """
+    global _current_model
+
+    y = data.y
+    fingerprint = data_fingerprint(data.account_id, data.X, y)
+    if _current_model is None:
+        _current_model = model_store.load()
+    if _current_model is not None and _current_model.fingerprint == fingerprint:
+        return _current_model.model, _current_model.scaler
+
+    snapshot = model_store.load_snapshot() if _current_model is not None else None
+    if snapshot is not None:
+        changed = changed_rows(data.account_id, data.X, y, *snapshot)
+        n_changed = int(changed.sum())
+        model, scaler = _current_model.model, _current_model.scaler
+
+        if n_changed == 0:
+            # Клиенты только удалились — модель остаётся прежней
+            model_store.update_fingerprint(fingerprint, data.account_id, data.X, y)
+            _current_model = StoredModel(model, scaler, fingerprint)
+            return model, scaler
+
+        if n_changed <= FINE_TUNE_MAX_FRACTION * len(data.X):
+            print(f"Дообучение модели на {n_changed} новых/изменённых записях...")
+            model.fit(scaler.transform(data.X[changed]), y[changed],
+                      epochs=FINE_TUNE_EPOCHS,
+                      batch_size=32,
+                      verbose=0)
+            model_store.save(model, scaler, fingerprint, data.account_id, data.X, y)
+            _current_model = StoredModel(model, scaler, fingerprint)
+            return model, scaler
+
+    print("Обучение модели...")
+    model, scaler = train_model(data.X, y)
+    model_store.save(model, scaler, fingerprint, data.account_id, data.X, y)
+    _current_model = StoredModel(model, scaler, fingerprint)
+    return model, scaler
+
+
+def score_clients(model: tf.keras.Model, scaler: StandardScaler, X: np.ndarray) -> np.ndarray:
+    """Скоры модели по строкам X.
+
+    Если задан DETECTOR_SCORING_WORKERS, большие наборы считаются в пуле процессов
+    (sharded_scoring.py) по сохранённой копии текущей модели.
+    """
+    if (SCORING_WORKERS > 0 and len(X) >= SCORING_MIN_ROWS
+            and _current_model is not None and _current_model.model is model):
+        try:
+            return score_in_pool(model_store.directory, X, _current_model.fingerprint)
+        except Exception as e:
+            print(f"Ошибка скоринга в пуле процессов, считаем в одном процессе: {e}")
+    return model.predict(scaler.transform(X), batch_size=SCORING_BATCH_SIZE, verbose=0).ravel()
+
+
+def _complaint_match_params() -> Dict[str, str]:
+    if not FUZZY_COMPLAINT_MATCHING:
+        return {}
+    return {"fuzzy": "true", "min_score": str(COMPLAINT_MIN_SCORE)}
+
+
+def load_complaint_matches() -> Optional[np.ndarray]:
+    """account_id клиентов, чей адрес совпал с адресом жалобы; None при ошибке.
+
+    Сопоставление делает сервис клиентов: по нормализованному ключу адреса в базе
+    и, если включено FUZZY_COMPLAINT_MATCHING, нечётко (address_matcher.py).
+    Сюда приходят только совпавшие account_id. Ошибка — не пустой список: иначе
+    все совпадения пропали бы из результата до следующего удачного запроса.
+    """
     try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
-        cur = conn.cursor()
-        cur.execute("SELECT complaint_address FROM complaints WHERE complaint_address IS NOT NULL;")
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
-
-        complaints_addresses = [row[0] for row in rows]
-        return complaints_addresses
+        response = requests.get(COMPLAINT_MATCHES_URL, params=_complaint_match_params())
+        response.raise_for_status()
+        return np.array(response.json()["account_id"], dtype=np.int64)
     except Exception as e:
-        print(f"Ошибка при загрузке complaints из БД: {e}")
-        return []
+        print(f"Ошибка при загрузке совпадений с жалобами: {e}")
+        return None
 
 
-def detect_violators(model: tf.keras.Model, scaler: StandardScaler,
-                     X: np.ndarray, addresses: List[str],
-                     raw_data: List[Dict]) -> List[Dict]:
+def load_listing_matches() -> Optional[np.ndarray]:
+    """account_id клиентов, чей адрес совпал с адресом объявления гостиницы на Avito
+    (hotel_listings.py); None при ошибке."""
     try:
-        complaints_addresses = load_complaints_addresses()
-        complaints_set = set(complaints_addresses)
-
-        X_scaled = scaler.transform(X)
-        predictions = model.predict(X_scaled, verbose=0)
-
-        violators = []
-        for i, pred in enumerate(predictions):
-            if raw_data[i].get("is_commercial", False):
-                continue
-
-            address = addresses[i]
-            current_status = raw_data[i].get("is_checked")
-
-            # Проверка на совпадение адреса с complaints — добавляем подозреваемого с приоритетом yellow
-            if address in complaints_set:
-                violator_data = {
-                    "accountId": raw_data[i]["account_id"],
-                    "address": address,
-                    "priority": "yellow",
-                    "isChecked": current_status if current_status else "no",
-                    "avgConsumption6m": float(X[i][0])
-                }
-                violators.append(violator_data)
-                continue
-
-            if current_status in ["under_review", "no"]:
-                avg_6 = X[i][0]
-                priority = "red" if avg_6 > 6000 else "yellow"
-
-                violator_data = {
-                    "accountId": raw_data[i]["account_id"],
-                    "address": address,
-                    "priority": priority,
-                    "isChecked": current_status,
-                    "avgConsumption6m": float(avg_6)
-                }
-                violators.append(violator_data)
-
-            elif current_status is None:
-                avg_6 = X[i][0]
-                if avg_6 > 3000:
-                    priority = "red" if avg_6 > 6000 else "yellow"
-
-                    violator_data = {
-                        "accountId": raw_data[i]["account_id"],
-                        "address": address,
-                        "priority": priority,
-                        "isChecked": "no",
-                        "avgConsumption6m": float(avg_6)
-                    }
-                    violators.append(violator_data)
-
-        return violators
+        response = requests.get(LISTING_MATCHES_URL, params=_complaint_match_params())
+        response.raise_for_status()
+        return np.array(response.json()["account_id"], dtype=np.int64)
     except Exception as e:
-        print(f"Ошибка при определении нарушителей: {e}")
-        return []
+        print(f"Ошибка при загрузке совпадений с объявлениями: {e}")
+        return None
+
+
+def apply_rules(data: ClientData, complaint_mask: np.ndarray,
+                listing_mask: Optional[np.ndarray] = None,
+                scores: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Правила отбора нарушителей в виде булевых масок.
+
+    Некоммерческие клиенты попадают в список, если:
+    - по их адресу сдаётся гостиница (объявление на Avito) — приоритет red;
+    - их адрес есть в жалобах — приоритет yellow;
+    - статус under_review/no — red при avg_6 > 6000, иначе yellow;
+    - статус не задан и avg_6 > 3000 — red при avg_6 > 6000, иначе yellow.
+    Отобранные клиенты со скором модели >= COMMERCIAL_SCORE_THRESHOLD (потребление
+    похоже на коммерческое) получают приоритет red. Скоры влияют только на приоритет,
+    поэтому режим candidates, где модель видит лишь кандидатов, даёт тот же результат.
+    Возвращает (selected, priority, is_checked) для всех строк.
+    """
+    residential = ~data.is_commercial
+    avg_6 = data.avg_6
+    unchecked = data.is_checked == ""
+
+    by_listing = residential & listing_mask if listing_mask is not None else np.zeros(len(residential), dtype=bool)
+    by_complaint = residential & complaint_mask
+    by_status = residential & ~by_complaint & np.isin(data.is_checked, OPEN_STATUSES)
+    by_threshold = residential & ~by_complaint & unchecked & (avg_6 > SUSPECT_THRESHOLD)
+    selected = by_listing | by_complaint | by_status | by_threshold
+
+    red = by_listing | (~by_complaint & (avg_6 > RED_THRESHOLD))
+    if scores is not None:
+        red |= scores >= COMMERCIAL_SCORE_THRESHOLD
+    priority = np.where(red, "red", "yellow")
+    is_checked = np.where(unchecked, "no", data.is_checked)
+    return selected, priority, is_checked
+
+
+def violators_from_rules(data: ClientData, selected: np.ndarray, priority: np.ndarray,
+                         is_checked: np.ndarray) -> List[Dict]:
+    idx = np.flatnonzero(selected)
+    return [
+        {
+            "accountId": account_id,
+            "address": address,
+            "priority": prio,
+            "isChecked": status,
+            "avgConsumption6m": avg,
+        }
+        for account_id, address, prio, status, avg in zip(
+            data.account_id[idx].tolist(),
+            data.address[idx].tolist(),
+            priority[idx].tolist(),
+            is_checked[idx].tolist(),
+            data.avg_6[idx].tolist(),
+        )
+    ]
 
 
-def send_violators_to_api(violators: List[Dict]) -> bool:
-    if not violators:
-        print("Нет нарушителей для отправки")
-        return False
+def detect_violators(model: tf.keras.Model, scaler: StandardScaler, data: ClientData,
+                     complaint_mask: Optional[np.ndarray] = None,
+                     listing_mask: Optional[np.ndarray] = None) -> Optional[List[Dict]]:
+    """Список нарушителей; None при ошибке (в том числе при загрузке совпадений).
 
+    Пустой список и None различаются: /over_consumers/sync удаляет всех, кого нет
+    в переданном списке, поэтому после ошибки синхронизировать нельзя.
+    """
     try:
-        delete_response = requests.delete("http://127.0.0.1:8001/over_consumers")
-        delete_response.raise_for_status()
+        if complaint_mask is None:
+            complaints = load_complaint_matches()
+            if complaints is None:
+                return None
+            complaint_mask = np.isin(data.account_id, complaints)
+        if listing_mask is None:
+            listings = load_listing_matches()
+            if listings is None:
+                return None
+            listing_mask = np.isin(data.account_id, listings)
+
+        scores = score_clients(model, scaler, data.X)
+        selected, priority, is_checked = apply_rules(data, complaint_mask, listing_mask, scores)
+        return violators_from_rules(data, selected, priority, is_checked)
+    except Exception as e:
+        print(f"Ошибка при определении нарушителей: {e}")
+        return None
+
 
-        response = requests.post(OVER_CONSUMERS_API_URL, json=violators)
+def send_violators_to_api(violators: List[Dict]) -> bool:
+    # Передаётся полный актуальный список: сервер сам добавит, обновит и удалит нужные строки
+    try:
+        response = requests.post(OVER_CONSUMERS_SYNC_URL, json=violators)
         response.raise_for_status()
-        print(f"Успешно отправлено {len(violators)} нарушителей")
+        result = response.json()
+        print(f"Синхронизировано {len(violators)} нарушителей: добавлено {result['inserted']}, "
+              f"обновлено {result['updated']}, удалено {result['deleted']}")
         return True
     except Exception as e:
         print(f"Ошибка при отправке данных: {e}")
         return False
 
 
+class IncrementalDetector:
+    """Инкрементальный режим: признаки, скоры и результат правил живут в памяти.
+
+    Каждый цикл забирает из /clients/changes только изменённых и удалённых
+    клиентов и пересчитывает лишь их строки. Строки хранятся в массивах с запасом
+    ёмкости; удалённые помечаются в alive и освобождаются при полной пересинхронизации,
+    которая раз в INCREMENTAL_RESYNC_CYCLES циклов заодно обновляет модель.
+    """
+
+    def __init__(self):
+        self.token = "0"
+        self.size = 0
+        self.cycles = 0
+        self.row_of: Dict[int, int] = {}
+        # account_id клиентов, совпавших с жалобами и с объявлениями гостиниц
+        self.complaints = np.empty(0, dtype=np.int64)
+        self.listings = np.empty(0, dtype=np.int64)
+        self.model: Optional[tf.keras.Model] = None
+        self.scaler: Optional[StandardScaler] = None
+        self._allocate(0)
+
+    def _allocate(self, capacity: int):
+        self.account_id = np.zeros(capacity, dtype=np.int64)
+        self.is_commercial = np.zeros(capacity, dtype=bool)
+        self.is_checked = np.full(capacity, "", dtype=object)
+        self.address = np.full(capacity, "", dtype=object)
+        self.X = np.zeros((capacity, 5))
+        self.scores = np.zeros(capacity)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.selected = np.zeros(capacity, dtype=bool)
+        self.priority = np.full(capacity, "yellow", dtype=object)
+        self.checked_out = np.full(capacity, "no", dtype=object)
+
+    def _reserve(self, extra: int):
+        capacity = len(self.alive)
+        if self.size + extra <= capacity:
+            return
+        new_capacity = max(2 * capacity, self.size + extra, 1024)
+        for name in ("account_id", "is_commercial", "is_checked", "address", "X", "scores",
+                     "alive", "selected", "priority", "checked_out"):
+            old = getattr(self, name)
+            new = np.zeros((new_capacity,) + old.shape[1:], dtype=old.dtype)
+            if old.dtype == object:
+                new[:] = ""
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def view(self, idx=None) -> ClientData:
+        idx = slice(0, self.size) if idx is None else idx
+        return ClientData(
+            account_id=self.account_id[idx],
+            is_commercial=self.is_commercial[idx],
+            is_checked=self.is_checked[idx],
+            address=self.address[idx],
+            X=self.X[idx],
+        )
+
+    def fetch_changes(self, since: str) -> Tuple[List[Dict], List[int], str]:
+        upserted, deleted = [], []
+        while True:
+            response = requests.get(CLIENTS_CHANGES_URL, params={"since": since})
+            response.raise_for_status()
+            page = response.json()
+            upserted.extend(page["upserted"])
+            deleted.extend(page["deleted"])
+            since = page["next"]
+            if not page["hasMore"]:
+                return upserted, deleted, since
+
+    def _remove(self, account_id: int):
+        row = self.row_of.pop(account_id, None)
+        if row is not None:
+            self.alive[row] = False
+            self.selected[row] = False
+
+    def _upsert(self, data: ClientData) -> np.ndarray:
+        ids = data.account_id.tolist()
+        self._reserve(len(ids))
+        rows = np.empty(len(ids), dtype=np.int64)
+        for i, account_id in enumerate(ids):
+            row = self.row_of.get(account_id)
+            if row is None:
+                row = self.size
+                self.size += 1
+                self.row_of[account_id] = row
+            rows[i] = row
+
+        self.account_id[rows] = data.account_id
+        self.is_commercial[rows] = data.is_commercial
+        self.is_checked[rows] = data.is_checked
+        self.address[rows] = data.address
+        self.X[rows] = data.X
+        self.alive[rows] = True
+        return rows
+
+    def _evaluate(self, rows: np.ndarray):
+        """Скоры модели и правила только для строк rows."""
+        if not len(rows):
+            return
+        data = self.view(rows)
+        self.scores[rows] = score_clients(self.model, self.scaler, data.X)
+        self._apply_rules(rows)
+
+    def _apply_rules(self, rows: np.ndarray):
+        data = self.view(rows)
+        # Скоры строк не пересчитываются при изменении жалоб и объявлений — берутся сохранённые
+        selected, priority, checked_out = apply_rules(data, np.isin(data.account_id, self.complaints),
+                                                      np.isin(data.account_id, self.listings),
+                                                      self.scores[rows])
+        self.selected[rows] = selected
+        self.priority[rows] = priority
+        self.checked_out[rows] = checked_out
+
+    def apply_changes(self, upserted: List[Dict], deleted: List[int]) -> int:
+        for account_id in deleted:
+            self._remove(account_id)
+        if not upserted:
+            return len(deleted)
+
+        data = build_client_data(columns_from_entries(upserted))
+        kept = set(data.account_id.tolist()) if data is not None else set()
+        # Клиенты, у которых после изменения меньше 3 месяцев данных, выпадают из расчёта
+        for entry in upserted:
+            if entry["account_id"] not in kept:
+                self._remove(entry["account_id"])
+        if data is not None:
+            self._evaluate(self._upsert(data))
+        return len(upserted) + len(deleted)
+
+    def resync(self):
+        """Полная загрузка через ленту изменений с нуля и обновление модели."""
+        # Совпадения — до сброса состояния: при ошибке цикл прерывается и всё остаётся как было
+        complaints, listings = load_complaint_matches(), load_listing_matches()
+        if complaints is None or listings is None:
+            raise RuntimeError("не удалось загрузить совпадения с жалобами и объявлениями")
+        upserted, _, token = self.fetch_changes("0")
+        self.token, self.size = token, 0
+        self.row_of = {}
+        self._allocate(0)
+        data = build_client_data(columns_from_entries(upserted)) if upserted else None
+        if data is None:
+            return
+        self.model, self.scaler = get_model(data)
+        self.complaints, self.listings = complaints, listings
+        self._evaluate(self._upsert(data))
+
+    def refresh_complaints(self) -> bool:
+        complaints = load_complaint_matches()
+        # При ошибке остаются прежние совпадения
+        if complaints is None or np.array_equal(complaints, self.complaints):
+            return False
+        # Жалобы меняются редко; при изменении правила пересчитываются по всем строкам
+        self.complaints = complaints
+        self._apply_rules(np.flatnonzero(self.alive[:self.size]))
+        return True
+
+    def refresh_listings(self) -> bool:
+        listings = load_listing_matches()
+        if listings is None:
+            return False
+        changed = np.setxor1d(listings, self.listings)
+        if not len(changed):
+            return False
+        # Пересчитываются только клиенты, у которых совпадение появилось или пропало
+        self.listings = listings
+        rows = [self.row_of[account_id] for account_id in changed.tolist() if account_id in self.row_of]
+        self._apply_rules(np.array(rows, dtype=np.int64))
+        return True
+
+    def violators(self) -> List[Dict]:
+        idx = np.flatnonzero(self.selected[:self.size] & self.alive[:self.size])
+        idx = idx[np.argsort(self.account_id[idx], kind="stable")]
+        return violators_from_rules(self.view(idx), np.ones(len(idx), dtype=bool),
+                                    self.priority[idx], self.checked_out[idx])
+
+    def cycle(self):
+        if self.model is None or self.cycles % INCREMENTAL_RESYNC_CYCLES == 0:
+            print("Полная синхронизация клиентов...")
+            self.resync()
+            changed = True
+        else:
+            upserted, deleted, token = self.fetch_changes(self.token)
+            self.token = token
+            changed = self.apply_changes(upserted, deleted) > 0
+            print(f"Изменений клиентов: {len(upserted)} обновлено, {len(deleted)} удалено")
+            changed = self.refresh_complaints() or changed
+            changed = self.refresh_listings() or changed
+        self.cycles += 1
+
+        if self.model is None:
+            print("Нет данных для обучения модели")
+            return
+        if changed:
+            send_violators_to_api(self.violators())
+
+
+def run_incremental(interval_seconds: int = 10):
+    detector = IncrementalDetector()
+    while True:
+        try:
+            detector.cycle()
+        except Exception as e:
+            print(f"Ошибка в инкрементальном цикле: {e}")
+        print(f"Ждем {interval_seconds} секунд до следующего запуска...")
+        time.sleep(interval_seconds)
+
+
+def run_candidates(interval_seconds: int = 10):
+    """Режим candidates: модели передаются только кандидаты, отобранные в базе.
+
+    Все клиенты загружаются лишь для обучения — при первом запуске без сохранённой
+    модели и раз в CANDIDATES_RETRAIN_CYCLES циклов (get_model не переобучает,
+    если данные не менялись).
+    """
+    global _current_model
+
+    cycles = 0
+    while True:
+        try:
+            if _current_model is None:
+                _current_model = model_store.load()
+            if _current_model is None or cycles % CANDIDATES_RETRAIN_CYCLES == 0:
+                print("Загрузка всех клиентов для обучения модели...")
+                data = load_data_from_export() if USE_COLUMNAR_EXPORT else load_data_from_api()
+                if data is not None:
+                    get_model(data)
+            cycles += 1
+
+            if _current_model is None:
+                print("Нет данных для обучения модели")
+            else:
+                violators = []
+                candidates = load_candidates()
+                if candidates is not None:
+                    data, complaint_mask, listing_mask = candidates
+                    print(f"Кандидатов в нарушители: {len(data.X)}")
+                    violators = detect_violators(_current_model.model, _current_model.scaler, data,
+                                                 complaint_mask, listing_mask)
+                if violators is None:
+                    print("Нарушители не определены, синхронизация пропущена")
+                else:
+                    send_violators_to_api(violators)
+        except Exception as e:
+            print(f"Ошибка в цикле candidates: {e}")
+        print(f"Ждем {interval_seconds} секунд до следующего запуска...")
+        time.sleep(interval_seconds)
+
+
 def main():
     print("Загрузка данных из API...")
-    X, y, addresses, raw_data = load_data_from_api()
+    if USE_COLUMNAR_EXPORT:
+        data = load_data_from_export()
+    else:
+        data = load_data_from_api()
 
-    if X is None or len(X) == 0:
+    if data is None:
         print("Не удалось загрузить данные или данные пусты. Завершение работы.")
         return
 
-    print(f"Загружено {len(X)} записей. Обучение модели...")
+    print(f"Загружено {len(data.X)} записей.")
     try:
-        model, scaler = train_model(X, y)
+        model, scaler = get_model(data)
     except Exception as e:
         print(f"Не удалось обучить модель: {e}")
         return
 
     print("Выявление нарушителей...")
-    violators = detect_violators(model, scaler, X, addresses, raw_data)
+    violators = detect_violators(model, scaler, data)
+    if violators is None:
+        print("Нарушители не определены, синхронизация пропущена")
+        return
 
     if violators:
         print("\n=== Нарушители ===")
@@ -228,12 +728,12 @@ def main():
                 f"ID: {violator['accountId']} | Адрес: {violator['address']} | Среднее потребление: {violator['avgConsumption6m']:.2f} кВт | Приоритет: {violator['priority']}")
         if len(violators) > 10:
             print(f"... и еще {len(violators) - 10} нарушителей")
-
-        print("\nОтправка данных во второй бэкенд...")
-        send_violators_to_api(violators)
     else:
         print("Нарушители не обнаружены")
 
+    print("\nОтправка данных во второй бэкенд...")
+    send_violators_to_api(violators)
+
 
 def run_periodically(interval_seconds: int = 10):
     while True:
@@ -246,7 +746,11 @@ def run_periodically(interval_seconds: int = 10):
 
 
 if __name__ == "__main__":
-    import os
     os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
 
-    run_periodically(interval_seconds=10)
+    if DETECTOR_MODE == "incremental":
+        run_incremental(interval_seconds=10)
+    elif DETECTOR_MODE == "candidates":
+        run_candidates(interval_seconds=10)
+    else:
+        run_periodically(interval_seconds=10)
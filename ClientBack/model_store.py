@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from typing import Optional, NamedTuple
+
+import numpy as np
+import tensorflow as tf
+from sklearn.preprocessing import StandardScaler
+
+# Каталог, где детектор хранит обученную модель между запусками
+MODEL_STORE_DIR = os.environ.get("DETECTOR_MODEL_DIR", os.path.join(os.path.dirname(__file__), "detector_models"))
+
+MODEL_FILE = "model.keras"
+SCALER_FILE = "scaler.pkl"
+SNAPSHOT_FILE = "snapshot.npz"
+META_FILE = "meta.json"
+# Файл с именем текущей версии в VERSIONS_DIR
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+# Сколько версий хранить: текущую и предыдущую, которую ещё может читать процесс пула
+KEEP_VERSIONS = 2
+
+
+class StoredModel(NamedTuple):
+    model: tf.keras.Model
+    scaler: StandardScaler
+    fingerprint: str
+
+
+def data_fingerprint(account_id: np.ndarray, X: np.ndarray, y: np.ndarray) -> str:
+    """Отпечаток обучающей выборки: меняется при любом изменении набора клиентов или их признаков."""
+    digest = hashlib.sha256()
+    for array in (account_id, X, y):
+        array = np.ascontiguousarray(array)
+        digest.update(str(array.dtype).encode())
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def changed_rows(account_id: np.ndarray, X: np.ndarray, y: np.ndarray,
+                 prev_account_id: np.ndarray, prev_X: np.ndarray, prev_y: np.ndarray) -> np.ndarray:
+    """Маска новых клиентов и клиентов, у которых изменились признаки или метка."""
+    if not len(prev_account_id):
+        return np.ones(len(account_id), dtype=bool)
+
+    order = np.argsort(prev_account_id, kind="stable")
+    sorted_ids = prev_account_id[order]
+    pos = np.clip(np.searchsorted(sorted_ids, account_id), 0, len(sorted_ids) - 1)
+    found = sorted_ids[pos] == account_id
+    prev_idx = order[pos]
+
+    changed = ~found
+    changed[found] = (np.any(X[found] != prev_X[prev_idx[found]], axis=1)
+                      | (y[found] != prev_y[prev_idx[found]]))
+    return changed
+
+
+class ModelStore:
+    """Модель, scaler и снимок обучающей выборки на диске.
+
+    Снимок (account_id, X, y) нужен, чтобы при следующем изменении данных
+    дообучать модель только на новых и изменившихся строках.
+
+    Каждая версия пишется в свой каталог versions/<имя> целиком (модель, scaler,
+    снимок и meta.json с отпечатком), и только потом файл CURRENT атомарно
+    переключается на неё. Читатель (в том числе процесс пула sharded_scoring.py)
+    один раз читает CURRENT и берёт все файлы из одного каталога, поэтому не может
+    получить новые веса со старым отпечатком. Хранилище старого формата (файлы
+    прямо в directory, без CURRENT) читается как текущая версия.
+    """
+
+    def __init__(self, directory: str = MODEL_STORE_DIR):
+        self.directory = directory
+
+    def _current_dir(self) -> str:
+        try:
+            with open(os.path.join(self.directory, CURRENT_FILE), encoding="utf-8") as f:
+                return os.path.join(self.directory, VERSIONS_DIR, f.read().strip())
+        except FileNotFoundError:
+            return self.directory
+
+    @staticmethod
+    def _fingerprint(version_dir: str) -> Optional[str]:
+        try:
+            with open(os.path.join(version_dir, META_FILE), encoding="utf-8") as f:
+                return json.load(f)["fingerprint"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def fingerprint(self) -> Optional[str]:
+        return self._fingerprint(self._current_dir())
+
+    def load(self) -> Optional[StoredModel]:
+        version_dir = self._current_dir()
+        fingerprint = self._fingerprint(version_dir)
+        if fingerprint is None:
+            return None
+        try:
+            model = tf.keras.models.load_model(os.path.join(version_dir, MODEL_FILE))
+            with open(os.path.join(version_dir, SCALER_FILE), "rb") as f:
+                scaler = pickle.load(f)
+        except Exception as e:
+            print(f"Не удалось загрузить сохранённую модель: {e}")
+            return None
+        return StoredModel(model, scaler, fingerprint)
+
+    def load_snapshot(self):
+        try:
+            with np.load(os.path.join(self._current_dir(), SNAPSHOT_FILE)) as snapshot:
+                return snapshot["account_id"], snapshot["X"], snapshot["y"]
+        except (OSError, KeyError):
+            return None
+
+    def _new_version(self) -> str:
+        versions = os.path.join(self.directory, VERSIONS_DIR)
+        os.makedirs(versions, exist_ok=True)
+        return tempfile.mkdtemp(prefix=f"{time.strftime('%Y%m%d-%H%M%S')}-", dir=versions)
+
+    def _write_data(self, version_dir: str, fingerprint: str,
+                    account_id: np.ndarray, X: np.ndarray, y: np.ndarray) -> None:
+        with open(os.path.join(version_dir, SNAPSHOT_FILE), "wb") as f:
+            np.savez(f, account_id=account_id, X=X, y=y)
+        with open(os.path.join(version_dir, META_FILE), "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": fingerprint, "rows": int(len(X))}, f)
+
+    def _publish(self, version_dir: str) -> None:
+        # Переключение версии — одна атомарная замена CURRENT
+        pointer = os.path.join(self.directory, CURRENT_FILE)
+        with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+            f.write(os.path.basename(version_dir))
+        os.replace(pointer + ".tmp", pointer)
+
+        versions = os.path.join(self.directory, VERSIONS_DIR)
+        old = sorted((os.path.join(versions, name) for name in os.listdir(versions)
+                      if name != os.path.basename(version_dir)), key=os.path.getmtime)
+        for path in old[:max(len(old) - (KEEP_VERSIONS - 1), 0)]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def save(self, model: tf.keras.Model, scaler: StandardScaler, fingerprint: str,
+             account_id: np.ndarray, X: np.ndarray, y: np.ndarray) -> None:
+        version_dir = self._new_version()
+        try:
+            model.save(os.path.join(version_dir, MODEL_FILE))
+            with open(os.path.join(version_dir, SCALER_FILE), "wb") as f:
+                pickle.dump(scaler, f)
+            self._write_data(version_dir, fingerprint, account_id, X, y)
+        except Exception:
+            # Недописанная версия не должна остаться на диске
+            shutil.rmtree(version_dir, ignore_errors=True)
+            raise
+        self._publish(version_dir)
+
+    def update_fingerprint(self, fingerprint: str, account_id: np.ndarray, X: np.ndarray, y: np.ndarray) -> None:
+        """Запоминает новую выборку без переобучения (например, если клиенты только удалялись).
+
+        Новая версия ссылается на файлы модели и scaler текущей жёсткими ссылками.
+        """
+        current = self._current_dir()
+        version_dir = self._new_version()
+        try:
+            for name in (MODEL_FILE, SCALER_FILE):
+                try:
+                    os.link(os.path.join(current, name), os.path.join(version_dir, name))
+                except OSError:
+                    shutil.copy2(os.path.join(current, name), os.path.join(version_dir, name))
+            self._write_data(version_dir, fingerprint, account_id, X, y)
+        except Exception:
+            shutil.rmtree(version_dir, ignore_errors=True)
+            raise
+        self._publish(version_dir)
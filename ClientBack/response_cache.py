@@ -0,0 +1,165 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, NamedTuple, Optional, Union
+
+from fastapi import Request
+from fastapi.responses import Response
+
+# Границы кэша: число записей, общий объём и максимальный размер одного ответа
+CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+CACHE_MAX_ENTRY_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRY_BYTES", str(128 * 1024 * 1024)))
+# Сколько секунд запись живёт независимо от маркера изменений базы
+CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "60"))
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    media_type: str
+    etag: str
+    stored_at: float
+
+
+def request_key(request: Request) -> str:
+    """Ключ кэша: путь и отсортированные параметры запроса."""
+    params = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return f"{request.url.path}?{params}"
+
+
+class ResponseCache:
+    """LRU-кэш готовых (уже сериализованных) ответов с поддержкой ETag.
+
+    Кэш сбрасывается (очищается и увеличивается generation):
+      * при invalidate() — эндпоинты записи этого процесса;
+      * при lookup() с маркером изменений базы больше запомненного — так видны записи
+        других воркеров uvicorn, bulk_loader.py и прочих процессов;
+    а каждая запись живёт не дольше ttl секунд — это ограничивает устаревание от
+    изменений, которые маркер не отражает (запрос прочитал маркер до фиксации
+    чужой транзакции, правка базы SQL в обход version).
+    Ответ, который начали считать до сброса, в кэш уже не попадёт. Кэш живёт в
+    памяти процесса: при нескольких воркерах uvicorn у каждого он свой.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES,
+                 max_entry_bytes: int = CACHE_MAX_ENTRY_BYTES, ttl: float = CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.ttl = ttl
+        self.generation = 0
+        self.marker: Optional[int] = None
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "not_modified": 0, "stores": 0,
+                       "evictions": 0, "invalidations": 0, "expired": 0, "too_large": 0}
+
+    def _response(self, entry: CachedResponse, request: Request) -> Response:
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+        if entry.etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type=entry.media_type, headers=headers)
+
+    def _clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+        self._bytes = 0
+        self._stats["invalidations"] += 1
+
+    def lookup(self, request: Request, marker: Optional[int] = None) -> Optional[Response]:
+        """Готовый ответ из кэша (200 или 304) либо None при промахе.
+
+        marker — маркер изменений базы, прочитанный перед запросом: если он вырос,
+        кэш сбрасывается. Маркер меньше запомненного (прочитан раньше, чем у
+        параллельного запроса) ничего не сбрасывает.
+        """
+        key = request_key(request)
+        with self._lock:
+            if marker is not None and (self.marker is None or marker > self.marker):
+                if self.marker is not None:
+                    self._clear()
+                self.marker = marker
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.stored_at > self.ttl:
+                del self._entries[key]
+                self._bytes -= len(entry.body)
+                self._stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            if entry.etag in request.headers.get("if-none-match", ""):
+                self._stats["not_modified"] += 1
+        return self._response(entry, request)
+
+    def _put(self, key: str, generation: int, body: bytes, media_type: str) -> CachedResponse:
+        entry = CachedResponse(body, media_type, '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest(),
+                               time.monotonic())
+        with self._lock:
+            if generation != self.generation:
+                return entry
+            if len(body) > self.max_entry_bytes:
+                self._stats["too_large"] += 1
+                return entry
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.body)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            self._stats["stores"] += 1
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.body)
+                self._stats["evictions"] += 1
+        return entry
+
+    def store(self, request: Request, generation: int, body: bytes,
+              media_type: str = "application/json") -> Response:
+        """Кладёт ответ в кэш (если данные не менялись с generation) и возвращает его."""
+        entry = self._put(request_key(request), generation, body, media_type)
+        return self._response(entry, request)
+
+    async def tee(self, request: Request, generation: int, chunks: AsyncIterator[Union[str, bytes]],
+                  media_type: str) -> AsyncIterator[bytes]:
+        """Пропускает потоковый ответ к клиенту и попутно собирает его для кэша.
+
+        Если ответ больше max_entry_bytes, накопление прекращается и память
+        не растёт — такой ответ просто не кэшируется.
+        """
+        key = request_key(request)
+        parts, size = [], 0
+        async for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            if parts is not None:
+                size += len(chunk)
+                if size > self.max_entry_bytes:
+                    parts = None
+                    with self._lock:
+                        self._stats["too_large"] += 1
+                else:
+                    parts.append(chunk)
+            yield chunk
+        if parts is not None:
+            self._put(key, generation, b"".join(parts), media_type)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_ratio": self._stats["hits"] / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "generation": self.generation,
+                "marker": self.marker,
+            }
@@ -0,0 +1,106 @@
+"""Скоринг клиентов моделью детектора в пуле процессов.
+
+model.predict на всём X одним процессом не использует остальные ядра. ShardedScorer
+делит строки на пачки по chunk_size и считает их в пуле из workers процессов:
+  * процессы запускаются через spawn (fork после импорта TensorFlow небезопасен) и
+    живут между циклами детектора;
+  * каждый процесс один раз загружает сохранённую модель и scaler из ModelStore и
+    перечитывает их, только если детектор сохранил модель с другим отпечатком;
+  * в процессе TensorFlow ограничен одним потоком, поэтому процессы не делят ядра
+    между собой и скорость растёт почти линейно с числом процессов;
+  * границы пачек зависят только от chunk_size, а результаты собираются в порядке
+    пачек, поэтому скоры не зависят от числа процессов и порядка их завершения.
+"""
+import atexit
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+import numpy as np
+
+# 0 — считать в процессе детектора
+SCORING_WORKERS = int(os.environ.get("DETECTOR_SCORING_WORKERS", "0"))
+# Батч model.predict: маленькая модель, и при батче по умолчанию (32) время уходит на накладные расходы Keras
+SCORING_BATCH_SIZE = 4096
+# Кратно SCORING_BATCH_SIZE: пачки разбиваются на те же батчи, что и весь X в одном процессе
+SCORING_CHUNK_SIZE = int(os.environ.get("DETECTOR_SCORING_CHUNK_SIZE", "65536"))
+# Меньше стольких строк пул не используется: передача данных дороже выигрыша
+SCORING_MIN_ROWS = int(os.environ.get("DETECTOR_SCORING_MIN_ROWS", "100000"))
+
+_worker_model = None
+
+
+def _init_worker(model_dir: str):
+    global _worker_model
+    # Один поток TensorFlow на процесс, параллельность — за счёт числа процессов
+    os.environ["TF_NUM_INTRAOP_THREADS"] = "1"
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    os.environ["OMP_NUM_THREADS"] = "1"
+    import tensorflow as tf
+    from model_store import ModelStore
+
+    tf.config.threading.set_intra_op_parallelism_threads(1)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    _worker_model = (ModelStore(model_dir), None)
+
+
+def _score_chunk(fingerprint: str, X: np.ndarray) -> np.ndarray:
+    global _worker_model
+    store, stored = _worker_model
+    if stored is None or stored.fingerprint != fingerprint:
+        stored = store.load()
+        if stored is None or stored.fingerprint != fingerprint:
+            raise RuntimeError(f"в хранилище нет модели {fingerprint[:12]}")
+        _worker_model = (store, stored)
+    return stored.model.predict(stored.scaler.transform(X), batch_size=SCORING_BATCH_SIZE, verbose=0).ravel()
+
+
+class ShardedScorer:
+    """Пул процессов, считающих скоры сохранённой модели по пачкам строк."""
+
+    def __init__(self, model_dir: str, workers: int, chunk_size: int = SCORING_CHUNK_SIZE):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self._executor = ProcessPoolExecutor(max_workers=workers,
+                                             mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_init_worker, initargs=(model_dir,))
+
+    def score(self, X: np.ndarray, fingerprint: str) -> np.ndarray:
+        """Скоры для всех строк X в исходном порядке; модель — сохранённая с отпечатком fingerprint."""
+        if not len(X):
+            return np.zeros(0)
+        chunks = [X[start:start + self.chunk_size] for start in range(0, len(X), self.chunk_size)]
+        # map отдаёт результаты в порядке пачек, независимо от того, какой процесс закончил первым
+        return np.concatenate(list(self._executor.map(_score_chunk, [fingerprint] * len(chunks), chunks)))
+
+    def close(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+_scorer: Optional[ShardedScorer] = None
+
+
+def get_scorer(model_dir: str) -> Optional[ShardedScorer]:
+    """Общий пул детектора; None, если DETECTOR_SCORING_WORKERS не задан."""
+    global _scorer
+    if SCORING_WORKERS <= 0:
+        return None
+    if _scorer is None:
+        _scorer = ShardedScorer(model_dir, SCORING_WORKERS)
+        atexit.register(_scorer.close)
+    return _scorer
+
+
+def score_in_pool(model_dir: str, X: np.ndarray, fingerprint: str) -> np.ndarray:
+    global _scorer
+    scorer = get_scorer(model_dir)
+    try:
+        return scorer.score(X, fingerprint)
+    except BrokenProcessPool:
+        # Упавший процесс ломает весь пул — останавливаем его процессы, следующий вызов создаст новый
+        atexit.unregister(scorer.close)
+        scorer.close(wait=False)
+        _scorer = None
+        raise
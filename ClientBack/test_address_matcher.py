@@ -0,0 +1,30 @@
+"""Проверки AddressMatcher: python -m pytest test_address_matcher.py (из каталога ClientBack)."""
+from address_matcher import AddressMatcher
+
+ADDRESSES = [
+    "Краснодарский край, г Краснодар, ул Чкалова, д. 71",
+    "Краснодарский край, г Краснодар, ул Чкалова, д. 71",
+    "Краснодарский край, г Краснодар, ул Чкалова, д. 71",
+    "Краснодарский край, г Краснодар, ул Чкалова, д. 73",
+    "Краснодарский край, г Краснодар, ул Ленина, д. 71",
+]
+
+
+def test_colocated_accounts_tie():
+    matcher = AddressMatcher([1, 2, 3, 4, 5], ADDRESSES)
+    matches = matcher.match(["Чкалова, 71"], min_score=0.3, ties=True)
+    assert sorted(m.account_id for m in matches) == [1, 2, 3]
+    assert len({m.score for m in matches}) == 1
+
+
+def test_top_without_ties():
+    matcher = AddressMatcher([1, 2, 3, 4, 5], ADDRESSES)
+    matches = matcher.match(["Чкалова, 71"], min_score=0.3)
+    assert len(matches) == 1 and matches[0].account_id in (1, 2, 3)
+
+
+def test_colocated_accounts_after_changes():
+    matcher = AddressMatcher([1, 4, 5], [ADDRESSES[0], ADDRESSES[3], ADDRESSES[4]])
+    matcher = matcher.apply_changes([2, 3], ADDRESSES[1:3], [])
+    matches = matcher.match(["ул. Чкалова 71, Краснодар"], min_score=0.3, ties=True)
+    assert sorted(m.account_id for m in matches) == [1, 2, 3]
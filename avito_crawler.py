@@ -0,0 +1,314 @@
+"""Параллельный сбор объявлений гостиниц Avito по нескольким городам.
+
+В отличие от AvitoParseScript.parse_hotels (один Chrome, один город, фиксированные
+sleep и пять XPath подряд с ожиданием по 3 с):
+  * города и объявления обрабатываются пулом из --workers воркеров;
+  * режим http — страницы забираются обычными HTTP-запросами (сессия на воркер),
+    режим browser — пулом headless Chrome, по драйверу на воркер;
+  * вместо sleep — явные условия готовности: страница выдачи ждёт появления
+    объявлений;
+  * адрес разбирается из HTML страницы через lxml (avito_extract.py) одинаково в
+    обоих режимах, живой DOM браузера ждётся, только если в HTML адреса нет;
+  * результаты пишутся в JSONL построчно по мере получения.
+
+Уже виденные объявления хранятся в ListingStore (--store, SQLite): на страницу
+объявления сборщик заходит, только если оно новое или его карточка в выдаче
+изменилась, а в JSONL попадают только такие объявления (поле status: new /
+changed). Повторный ежедневный обход региона стоит столько, сколько в нём новых
+и изменённых объявлений. --full заходит на все объявления заново.
+
+--base-url позволяет прогнать сборщик на сохранённых HTML-страницах, отданных
+локальным сервером (python -m http.server в каталоге с выгрузкой).
+
+Пример:
+    python avito_crawler.py krasnodar sochi anapa --workers 8 --output hotels.jsonl
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import urljoin
+
+import requests
+from lxml import html
+
+from avito_extract import AddressExtractor
+from listing_store import LISTING_STORE_PATH, ListingStore, card_hash, listing_id
+
+BASE_URL = "https://www.avito.ru"
+SEARCH_PATH = "/{city}/predlozheniya_uslug/domashniy_personalgostinicy-ASgBAgICAUSYA9IV?q=гостиница&p={page}"
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+              "Chrome/120.0.0.0 Safari/537.36")
+
+ITEM_XPATH = '//div[@data-marker="item"]'
+TITLE_XPATH = './/a[@data-marker="item-title"]'
+
+REQUEST_TIMEOUT = 30
+# Сколько ждать появления объявлений в режиме browser
+READY_TIMEOUT = 10
+RETRIES = 3
+
+
+def search_url(base_url: str, city: str, page: int) -> str:
+    return base_url.rstrip("/") + SEARCH_PATH.format(city=city, page=page)
+
+
+def parse_listing_page(page_html: str, page_url: str) -> List[Dict[str, str]]:
+    """Объявления со страницы выдачи: [{"title", "link", "hash"}]."""
+    tree = html.fromstring(page_html)
+    items = []
+    for item in tree.xpath(ITEM_XPATH):
+        links = item.xpath(TITLE_XPATH)
+        if not links or not links[0].get("href"):
+            continue
+        items.append({"title": links[0].text_content().strip(), "link": urljoin(page_url, links[0].get("href")),
+                      "hash": card_hash(item)})
+    return items
+
+
+class HttpFetcher:
+    """Страницы обычными GET-запросами; у каждого потока своя сессия."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.headers["User-Agent"] = USER_AGENT
+        return session
+
+    def _get(self, url: str) -> str:
+        for attempt in range(1, RETRIES + 1):
+            try:
+                response = self._session().get(url, timeout=REQUEST_TIMEOUT)
+                if response.status_code in (429, 500, 502, 503, 504) and attempt < RETRIES:
+                    time.sleep(2 ** attempt)
+                    continue
+                response.raise_for_status()
+                return response.text
+            except requests.ConnectionError:
+                if attempt == RETRIES:
+                    raise
+                time.sleep(2 ** attempt)
+            finally:
+                if self.delay:
+                    time.sleep(self.delay)
+
+    def listing_page(self, url: str) -> str:
+        return self._get(url)
+
+    def address(self, url: str, extractor: AddressExtractor) -> str:
+        return extractor.extract(self._get(url))
+
+    def close(self) -> None:
+        pass
+
+
+class BrowserFetcher:
+    """Пул headless Chrome: воркер берёт свободный драйвер на время одной страницы."""
+
+    def __init__(self, size: int, delay: float = 0.0):
+        # selenium нужен только этому режиму
+        from selenium import webdriver
+
+        self.delay = delay
+        self._drivers: "queue.Queue" = queue.Queue()
+        self._all = []
+        options = webdriver.ChromeOptions()
+        options.add_argument("--headless=new")
+        options.add_argument("--disable-blink-features=AutomationControlled")
+        options.add_argument(f"user-agent={USER_AGENT}")
+        for _ in range(size):
+            driver = webdriver.Chrome(options=options)
+            driver.set_page_load_timeout(REQUEST_TIMEOUT)
+            self._all.append(driver)
+            self._drivers.put(driver)
+
+    @contextmanager
+    def _driver(self) -> Iterator:
+        driver = self._drivers.get()
+        try:
+            yield driver
+        finally:
+            if self.delay:
+                time.sleep(self.delay)
+            self._drivers.put(driver)
+
+    def listing_page(self, url: str) -> str:
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        with self._driver() as driver:
+            driver.get(url)
+            try:
+                WebDriverWait(driver, READY_TIMEOUT).until(lambda d: d.find_elements(By.XPATH, ITEM_XPATH))
+            except TimeoutException:
+                return driver.page_source
+            # Догружаем ленту прокруткой, пока число объявлений растёт
+            count = len(driver.find_elements(By.XPATH, ITEM_XPATH))
+            while True:
+                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+                try:
+                    WebDriverWait(driver, 2).until(lambda d: len(d.find_elements(By.XPATH, ITEM_XPATH)) > count)
+                except TimeoutException:
+                    break
+                count = len(driver.find_elements(By.XPATH, ITEM_XPATH))
+            return driver.page_source
+
+    def address(self, url: str, extractor: AddressExtractor) -> str:
+        with self._driver() as driver:
+            driver.get(url)
+            return extractor.extract_from_driver(driver)
+
+    def close(self) -> None:
+        for driver in self._all:
+            driver.quit()
+
+
+class JsonlWriter:
+    """Потокобезопасная запись JSONL: строка на объявление, сразу на диск."""
+
+    def __init__(self, path: str):
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def write(self, record: Dict[str, str]) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self.count += 1
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class Crawler:
+    def __init__(self, fetcher, writer: JsonlWriter, workers: int, base_url: str = BASE_URL,
+                 max_results: int = 50, max_pages: int = 5, store: Optional[ListingStore] = None,
+                 full: bool = False):
+        self.fetcher = fetcher
+        self.writer = writer
+        self.store = store
+        self.full = full
+        self.extractor = AddressExtractor()
+        self.base_url = base_url
+        self.max_results = max_results
+        self.max_pages = max_pages
+        self._executor = ThreadPoolExecutor(workers)
+        self._details: List[Future] = []
+        self._seen = set()
+        self._lock = threading.Lock()
+        self.stats = {"pages": 0, "listings": 0, "unchanged": 0, "errors": 0}
+
+    def _crawl_city(self, city: str) -> None:
+        queued = 0
+        for page in range(1, self.max_pages + 1):
+            url = search_url(self.base_url, city, page)
+            try:
+                items = parse_listing_page(self.fetcher.listing_page(url), url)
+            except Exception as e:
+                self._count("errors")
+                print(f"Ошибка страницы выдачи {url}: {e}")
+                return
+            self._count("pages")
+            if not items:
+                return
+            for item in items:
+                with self._lock:
+                    if item["link"] in self._seen:
+                        continue
+                    self._seen.add(item["link"])
+                queued += 1
+                item["id"] = listing_id(item["link"])
+                status = self.store.check(item["id"], item["hash"]) if self.store is not None else "new"
+                if status is None and not self.full:
+                    # Карточка не изменилась — страницу объявления не открываем
+                    self._count("unchanged")
+                else:
+                    # Страницы объявлений обрабатываются, пока город дочитывает выдачу
+                    self._details.append(self._executor.submit(self._crawl_listing, city, item, status or "recheck"))
+                if queued >= self.max_results:
+                    return
+
+    def _crawl_listing(self, city: str, item: Dict[str, str], status: str) -> None:
+        try:
+            address = self.fetcher.address(item["link"], self.extractor)
+        except Exception as e:
+            self._count("errors")
+            print(f"Ошибка при обработке объявления {item['link']}: {e}")
+            return
+        if self.store is not None:
+            self.store.save(item["id"], item["link"], city, item["title"], address, item["hash"])
+        self.writer.write({
+            "id": item["id"],
+            "status": status,
+            "city": city,
+            "title": item["title"],
+            "address": address,
+            "link": item["link"],
+            "scraped_at": datetime.now(timezone.utc).isoformat(),
+        })
+        self._count("listings")
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def run(self, cities: List[str]) -> None:
+        for future in [self._executor.submit(self._crawl_city, city) for city in cities]:
+            future.result()
+        # Новые задачи объявлений больше не появятся — дожидаемся всех
+        for future in list(self._details):
+            future.result()
+        self._executor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("cities", nargs="+", help="города в формате Avito (krasnodar, sochi, ...)")
+    parser.add_argument("--mode", choices=["http", "browser"], default="http")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-results", type=int, default=50, help="объявлений на город")
+    parser.add_argument("--max-pages", type=int, default=5, help="страниц выдачи на город")
+    parser.add_argument("--delay", type=float, default=0.0, help="пауза воркера после запроса, с")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--output", default="hotels.jsonl", help="новые и изменённые объявления")
+    parser.add_argument("--store", default=LISTING_STORE_PATH, help="SQLite с уже виденными объявлениями")
+    parser.add_argument("--no-store", action="store_true", help="не пользоваться хранилищем")
+    parser.add_argument("--full", action="store_true", help="зайти на все объявления, даже неизменённые")
+    args = parser.parse_args()
+
+    fetcher = BrowserFetcher(args.workers, args.delay) if args.mode == "browser" else HttpFetcher(args.delay)
+    writer = JsonlWriter(args.output)
+    store = None if args.no_store else ListingStore(args.store)
+    crawler = Crawler(fetcher, writer, args.workers, args.base_url, args.max_results, args.max_pages,
+                      store, args.full)
+    started = time.perf_counter()
+    try:
+        crawler.run(args.cities)
+    finally:
+        writer.close()
+        fetcher.close()
+        if store is not None:
+            store.close()
+    elapsed = time.perf_counter() - started
+    print(f"Объявлений: {crawler.stats['listings']}, без изменений: {crawler.stats['unchanged']}, "
+          f"страниц выдачи: {crawler.stats['pages']}, "
+          f"ошибок: {crawler.stats['errors']}, {elapsed:.1f} с "
+          f"({crawler.stats['listings'] / elapsed * 60:.0f} объявлений/мин)")
+    print(f"Результаты: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Извлечение адреса со страницы объявления Avito.
+
+get_hotel_address перебирал пять XPath через WebDriverWait(driver, 3) каждый:
+если адрес находился только последним селектором или его не было, объявление
+стоило до 12–15 с ожидания. AddressExtractor вместо этого:
+  * берёт HTML страницы один раз и разбирает его lxml — все селекторы считаются
+    по одному дереву за миллисекунды;
+  * перебирает селекторы всегда в порядке ADDRESS_SELECTORS (первый сработавший
+    важнее), но для каждого макета страницы (набор data-marker на странице)
+    считает промахи селекторов: селектор, не сработавший SKIP_AFTER_MISSES страниц
+    подряд, для этого макета пропускается. Если остальные селекторы адреса не
+    нашли, пропущенные всё равно проверяются, поэтому адрес из-за пропуска не теряется;
+  * к живому DOM браузера обращается, только если в HTML адреса нет (блок адреса
+    догружается скриптом): один WebDriverWait на объединение всех селекторов,
+    затем повторный разбор.
+
+Проверка на сохранённых страницах:
+    python avito_extract.py page1.html page2.html ...
+"""
+import hashlib
+import re
+import sys
+import threading
+import time
+from typing import Dict, List
+
+from lxml import etree, html
+
+ADDRESS_SELECTORS = [
+    '//div[@data-marker="seller-address/address"]',
+    '//span[@itemprop="streetAddress"]',
+    '//div[contains(@class, "style-item-address")]',
+    '//div[contains(text(), "Адрес:")]/following-sibling::div',
+    '//div[contains(@class, "location-value")]',
+]
+ANY_ADDRESS = " | ".join(ADDRESS_SELECTORS)
+NO_ADDRESS = "Адрес не указан"
+# Сколько ждать блок адреса в живом DOM, если его нет в HTML страницы
+FALLBACK_TIMEOUT = 3
+# После стольких промахов подряд на страницах одного макета селектор для него пропускается
+SKIP_AFTER_MISSES = 3
+
+_SPACES_RE = re.compile(r"\s+")
+_DIGITS_RE = re.compile(r"\d+")
+
+
+def element_text(element) -> str:
+    # Текст вложенных элементов через пробел, как его показывает браузер
+    return _SPACES_RE.sub(" ", " ".join(element.itertext())).strip()
+
+
+def layout_signature(tree) -> str:
+    """Макет страницы — набор значений data-marker (цифры из них убраны)."""
+    markers = {_DIGITS_RE.sub("", marker) for marker in tree.xpath("//@data-marker")}
+    return hashlib.sha1("\n".join(sorted(markers)).encode("utf-8")).hexdigest()[:16]
+
+
+class AddressExtractor:
+    """Адрес по HTML страницы с запоминанием промахивающихся селекторов для каждого макета.
+
+    Один экземпляр можно использовать из нескольких потоков.
+    """
+
+    def __init__(self, selectors: List[str] = ADDRESS_SELECTORS):
+        self.selectors = [(selector, etree.XPath(selector)) for selector in selectors]
+        # Макет -> число промахов подряд для каждого селектора
+        self._misses: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"pages": 0, "skipped": 0, "found": 0, "fallbacks": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def extract(self, page_html: str) -> str:
+        self._count("pages")
+        tree = html.fromstring(page_html)
+        layout = layout_signature(tree)
+        with self._lock:
+            misses = list(self._misses.get(layout, [0] * len(self.selectors)))
+        skipped = [index for index, count in enumerate(misses) if count >= SKIP_AFTER_MISSES]
+        checked = [index for index in range(len(self.selectors)) if index not in skipped]
+
+        # Сначала без промахивающихся селекторов, в порядке приоритета; пропущенные — только если адреса нет
+        address, hit = self._first_match(tree, checked, misses)
+        if hit is None:
+            address, hit = self._first_match(tree, skipped, misses)
+        elif skipped:
+            self._count("skipped")
+        with self._lock:
+            self._misses[layout] = misses
+        if hit is None:
+            return NO_ADDRESS
+        self._count("found")
+        return address
+
+    def _first_match(self, tree, indexes: List[int], misses: List[int]):
+        for index in indexes:
+            for element in self.selectors[index][1](tree):
+                address = element_text(element)
+                if len(address) > 5:
+                    misses[index] = 0
+                    return address, index
+            misses[index] += 1
+        return None, None
+
+    def extract_from_driver(self, driver, timeout: float = FALLBACK_TIMEOUT) -> str:
+        """Адрес с открытой в selenium страницы; живой DOM — только если в HTML адреса нет."""
+        address = self.extract(driver.page_source)
+        if address != NO_ADDRESS:
+            return address
+
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        self._count("fallbacks")
+        try:
+            WebDriverWait(driver, timeout).until(lambda d: d.find_elements(By.XPATH, ANY_ADDRESS))
+        except TimeoutException:
+            return NO_ADDRESS
+        return self.extract(driver.page_source)
+
+    def layouts(self) -> Dict[str, List[str]]:
+        """Макет -> селекторы, которые для него пропускаются."""
+        with self._lock:
+            return {layout: [self.selectors[index][0] for index, count in enumerate(misses)
+                             if count >= SKIP_AFTER_MISSES]
+                    for layout, misses in self._misses.items()}
+
+
+def main():
+    extractor = AddressExtractor()
+    pages = []
+    for path in sys.argv[1:]:
+        with open(path, encoding="utf-8") as f:
+            pages.append((path, f.read()))
+    if not pages:
+        print("Использование: python avito_extract.py page.html [page.html ...]")
+        return
+
+    started = time.perf_counter()
+    for path, page_html in pages:
+        print(f"{path}: {extractor.extract(page_html)}")
+    elapsed = time.perf_counter() - started
+    print(f"Страниц: {len(pages)}, {elapsed / len(pages) * 1000:.2f} мс на страницу, "
+          f"статистика: {extractor.stats}, макетов: {len(extractor.layouts())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Хранилище уже виденных объявлений Avito (SQLite).
+
+Одна строка на объявление, ключ — ID объявления из ссылки. Для каждого хранится
+хеш карточки из выдачи (заголовок, цена, описание — без «2 часа назад» и прочих
+меняющихся каждый день полей), адрес со страницы объявления и время, когда
+объявление последний раз встречалось в выдаче и когда менялось.
+
+Повторный обход региона заходит на страницу объявления, только если объявление
+новое, его карточка изменилась или адрес не перепроверялся дольше recheck_days;
+остальным просто обновляется last_seen. Объявления, пропавшие из выдачи, видны
+по старому last_seen.
+
+«Адрес не указан» бывает и от таймаута или капчи, поэтому такой результат
+перепроверяется через missing_recheck_hours, а уже известный адрес он не затирает:
+объявление остаётся с прежними адресом, хешем и last_checked и будет проверено снова.
+
+Выгрузка в JSONL:
+    python listing_store.py listings.sqlite3 --city krasnodar --output hotels.jsonl
+"""
+import argparse
+import copy
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, Optional
+from urllib.parse import urlsplit
+
+from lxml import html
+
+from avito_extract import NO_ADDRESS
+
+LISTING_STORE_PATH = "listings.sqlite3"
+# Через сколько дней перепроверять адрес объявления с неизменной карточкой
+RECHECK_DAYS = 30
+# Через сколько часов перепроверять объявление, адрес которого не удалось получить
+MISSING_RECHECK_HOURS = 6
+
+# Части карточки, которые меняются без изменения самого объявления
+VOLATILE_XPATH = './/*[contains(@data-marker, "date")]'
+
+_ID_RE = re.compile(r"_(\d{5,})$")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def listing_id(url: str) -> str:
+    """ID объявления: число в конце пути (…/gostinitsa_1234567890), иначе путь без параметров."""
+    path = urlsplit(url).path.rstrip("/")
+    match = _ID_RE.search(path)
+    return match.group(1) if match else path
+
+
+def card_hash(card) -> str:
+    """Хеш карточки выдачи (элемент lxml или её HTML) без меняющихся полей."""
+    if isinstance(card, str):
+        card = html.fromstring(card)
+    else:
+        card = copy.deepcopy(card)
+    for element in card.xpath(VOLATILE_XPATH):
+        element.drop_tree()
+    text = _SPACES_RE.sub(" ", card.text_content()).strip()
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class ListingStore:
+    """Таблица listings в SQLite; одно соединение на все потоки, запросы под блокировкой."""
+
+    def __init__(self, path: str = LISTING_STORE_PATH, recheck_days: float = RECHECK_DAYS,
+                 missing_recheck_hours: float = MISSING_RECHECK_HOURS):
+        self.recheck_seconds = recheck_days * 86400
+        self.missing_recheck_seconds = missing_recheck_hours * 3600
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS listings (
+                listing_id TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                city TEXT NOT NULL,
+                title TEXT,
+                address TEXT,
+                content_hash TEXT NOT NULL,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                last_changed REAL NOT NULL,
+                last_checked REAL NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_listings_city_last_seen ON listings (city, last_seen)")
+        self._conn.commit()
+
+    def check(self, listing_id: str, content_hash: str) -> Optional[str]:
+        """None — объявление не изменилось (last_seen обновлён), иначе "new" или "changed"."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT address, content_hash, last_checked FROM listings WHERE listing_id = ?",
+                (listing_id,)).fetchone()
+            if row is None:
+                return "new"
+            recheck = self.recheck_seconds if row["address"] not in (None, NO_ADDRESS) else self.missing_recheck_seconds
+            if row["content_hash"] != content_hash or now - row["last_checked"] > recheck:
+                return "changed"
+            self._conn.execute("UPDATE listings SET last_seen = ? WHERE listing_id = ?", (now, listing_id))
+            self._conn.commit()
+        return None
+
+    def save(self, listing_id: str, url: str, city: str, title: str, address: str, content_hash: str) -> None:
+        now = time.time()
+        with self._lock:
+            if address == NO_ADDRESS:
+                # Известный адрес не затираем: хеш и last_checked прежние, объявление проверится снова
+                updated = self._conn.execute("""
+                    UPDATE listings SET url = ?, city = ?, title = ?, last_seen = ?
+                    WHERE listing_id = ? AND address IS NOT NULL AND address != ?
+                    """, (url, city, title, now, listing_id, NO_ADDRESS)).rowcount
+                if updated:
+                    self._conn.commit()
+                    return
+            self._conn.execute("""
+                INSERT INTO listings (listing_id, url, city, title, address, content_hash,
+                                      first_seen, last_seen, last_changed, last_checked)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (listing_id) DO UPDATE SET
+                    url = excluded.url,
+                    city = excluded.city,
+                    title = excluded.title,
+                    last_changed = CASE WHEN listings.content_hash = excluded.content_hash
+                                         AND listings.address IS excluded.address
+                                        THEN listings.last_changed ELSE excluded.last_changed END,
+                    address = excluded.address,
+                    content_hash = excluded.content_hash,
+                    last_seen = excluded.last_seen,
+                    last_checked = excluded.last_checked
+                """, (listing_id, url, city, title, address, content_hash, now, now, now, now))
+            self._conn.commit()
+
+    def listings(self, city: Optional[str] = None, seen_since: float = 0.0) -> Iterator[Dict]:
+        sql = "SELECT * FROM listings WHERE last_seen >= ?"
+        params = [seen_since]
+        if city:
+            sql += " AND city = ?"
+            params.append(city)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY city, listing_id", params).fetchall()
+        for row in rows:
+            yield dict(row)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Выгрузка объявлений из хранилища в JSONL")
+    parser.add_argument("path", nargs="?", default=LISTING_STORE_PATH)
+    parser.add_argument("--city")
+    parser.add_argument("--seen-days", type=float, default=0, help="только встречавшиеся в выдаче за N дней")
+    parser.add_argument("--output", default="-")
+    args = parser.parse_args()
+
+    store = ListingStore(args.path)
+    since = time.time() - args.seen_days * 86400 if args.seen_days else 0.0
+    out = open(args.output, "w", encoding="utf-8") if args.output != "-" else None
+    count = 0
+    try:
+        for row in store.listings(args.city, since):
+            line = json.dumps(row, ensure_ascii=False)
+            if out is None:
+                print(line)
+            else:
+                out.write(line + "\n")
+            count += 1
+    finally:
+        store.close()
+        if out is not None:
+            out.close()
+            print(f"Выгружено объявлений: {count}")
+
+
+if __name__ == "__main__":
+    main()